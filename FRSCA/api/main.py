@@ -1,14 +1,23 @@
 import os
 import sys
 import json
+import hashlib
 import numpy as np
-from typing import Dict
+from typing import Dict, List
+from contextlib import asynccontextmanager
 
 from fastapi.staticfiles import StaticFiles
 
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response
+from pydantic import BaseModel, Field
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:  # falls back to the stdlib encoder
+    orjson = None
 
 # -----------------------------
 # Fix import path
@@ -19,39 +28,424 @@ sys.path.append(BASE_DIR)
 # -----------------------------
 # Import your logic
 # -----------------------------
-from scripts.generate_outfit import generate_outfit
-from scripts.slot_alternatives import recommend_slot_alternatives
+from scripts.generate_outfit import generate_outfit, build_item
+from scripts.slot_alternatives import (
+    recommend_slot_alternatives, score_slot_candidates, alternative_item
+)
+from scripts.slots import get_slot
+from scripts.sessions import OutfitSession, TTLStore
+from scripts.rankings import Ranking, encode_cursor, decode_cursor
+from scripts.recommender import recommend
+from scripts.catalog import build_facets, normalize_rows
+from scripts.sharding import ShardCoordinator, start_local_shards
+from scripts.profiling import ProfileRing
+from scripts.validate_catalog import validate_catalog, validate_shards, stale_reason
+from scripts.signatures import load_signatures
+from scripts.compat_projection import load_compat_embeddings, compat_rejection
 
 # -----------------------------
 # Load data ONCE at startup
 # -----------------------------
-PROC_DIR = os.path.join(BASE_DIR, "processed")
+PROC_DIR = os.environ.get("FRSCA_PROC_DIR", os.path.join(BASE_DIR, "processed"))
+IMAGE_DIR = os.environ.get("FRSCA_IMAGE_DIR", os.path.join(BASE_DIR, "train_images"))
+
+# Refuse to start on a misaligned catalog (scripts/validate_catalog.py);
+# FRSCA_VALIDATE=0 skips the check, FRSCA_VALIDATE_FILES=0 skips the
+# image file stat
+VALIDATE = os.environ.get("FRSCA_VALIDATE", "1") == "1"
+VALIDATE_FILES = os.environ.get("FRSCA_VALIDATE_FILES", "1") == "1"
+
+# FRSCA_COMPAT=1 scores outfits in the learned compatibility space
+# (scripts/compat_projection.py); off by default, and refused unless
+# its training report shows it beating raw cosine
+USE_COMPAT = os.environ.get("FRSCA_COMPAT", "0") == "1"
+
+
+def check_report(name, report):
+    if report["problems"]:
+        raise RuntimeError(
+            f"Catalog {name} failed validation:\n  - "
+            + "\n  - ".join(report["problems"])
+        )
+
+
+def load_catalog(metadata_file, embeddings_file, names_file, signatures_file, compat_file):
+    """
+    Load one searchable catalog plus the arrays precomputed once
+    for vectorized scoring.
+    """
+    embeddings = np.load(os.path.join(PROC_DIR, embeddings_file))
+    image_names = np.load(
+        os.path.join(PROC_DIR, names_file),
+        allow_pickle=True
+    )
+
+    with open(os.path.join(PROC_DIR, metadata_file)) as f:
+        metadata = json.load(f)
+
+    fingerprint = None
+    if VALIDATE:
+        report = validate_catalog(
+            PROC_DIR,
+            IMAGE_DIR,
+            embeddings=embeddings,
+            image_names=image_names,
+            metadata=metadata,
+            check_images=VALIDATE_FILES,
+            metadata_file=metadata_file,
+            names_file=names_file
+        )
+        check_report(metadata_file, report)
+        fingerprint = report["fingerprint"]
+
+    # signatures built from another catalog version would shortlist
+    # the wrong rows, so they are dropped (scoring falls back to exact)
+    signatures = load_signatures(signatures_file, PROC_DIR)
+    if signatures is not None:
+        reason = stale_reason(
+            signatures_file, signatures.fingerprint, len(signatures.vectors),
+            fingerprint, len(embeddings)
+        )
+        if reason:
+            print(f"⚠️  {reason}; scoring exactly until scripts/signatures.py is re-run")
+            signatures = None
+
+    # compatibility vectors were asked for explicitly, so missing,
+    # stale or unproven ones stop startup instead of silently
+    # changing how outfits score
+    compat = None
+    if USE_COMPAT:
+        loaded = load_compat_embeddings(compat_file, PROC_DIR)
+        if loaded is None:
+            raise RuntimeError(f"FRSCA_COMPAT=1 but {compat_file} is missing; run scripts/compat_projection.py")
+        compat, built_from, training_report = loaded
+        reason = stale_reason(compat_file, built_from, len(compat), fingerprint, len(embeddings))
+        if reason:
+            raise RuntimeError(f"{reason}; re-run scripts/compat_projection.py")
+        reason = compat_rejection(training_report)
+        if reason:
+            raise RuntimeError(f"FRSCA_COMPAT=1 refused for {compat_file}: {reason}")
+
+    return {
+        "metadata": metadata,
+        "embeddings": embeddings,
+        "image_names": image_names,
+        "facets": build_facets(metadata),
+        "unit_embeddings": normalize_rows(embeddings),
+        "image_index": {str(name): i for i, name in enumerate(image_names)},
+        "fingerprint": fingerprint,
+        # two-stage retrieval (scripts/signatures.py), None if not built
+        "signatures": signatures,
+        # learned compatibility vectors, None if not trained
+        "compat": compat,
+        # outfit anchors, cached by generate_outfit per context
+        "anchors": {}
+    }
+
+
+# Sharded mode (scripts/sharding.py): the catalog lives in shard
+# worker processes and this process only coordinates queries. Only
+# item-level /generate-outfit and /slot-alternatives are served; a
+# relative FRSCA_SHARD_DIR is resolved against FRSCA/
+SHARD_DIR = os.environ.get("FRSCA_SHARD_DIR")
+if SHARD_DIR:
+    SHARD_DIR = os.path.join(BASE_DIR, SHARD_DIR)
+coordinator = None
+
+# "item": every image; "product": one pooled entry per product
+# (all variants and views of it), written by scripts/build_metadata.py
+catalogs = {}
+
+if not SHARD_DIR:
+    catalogs["item"] = load_catalog(
+        "metadata.json", "embeddings.npy", "image_names.npy",
+        "signatures.npz", "compat_embeddings.npz"
+    )
+
+    if os.path.exists(os.path.join(PROC_DIR, "products.json")):
+        catalogs["product"] = load_catalog(
+            "products.json", "product_embeddings.npy", "product_image_names.npy",
+            "product_signatures.npz", "product_compat_embeddings.npz"
+        )
+
+metadata = catalogs.get("item", {}).get("metadata")
+embeddings = catalogs.get("item", {}).get("embeddings")
+image_names = catalogs.get("item", {}).get("image_names")
+
+# image name → product id, so item images sent back by clients
+# can be resolved at product level
+image_to_product = {
+    str(image_names[i]): product["id"]
+    for product in catalogs.get("product", {}).get("metadata", [])
+    for i in product["members"]
+}
+
+# Score near-duplicate cluster representatives only (scripts/dedup.py)
+CANONICAL_ONLY = os.environ.get("FRSCA_CANONICAL_ONLY", "0") == "1"
+
+# Two-stage retrieval: when signatures were built, re-score only the
+# SHORTLIST best candidates by signature (0 = always score exactly)
+SHORTLIST = int(os.environ.get("FRSCA_SHORTLIST", "300"))
+
+
+def scoring_args(catalog, shortlist=SHORTLIST):
+    """
+    Vectors the outfit scorers compare: the learned compatibility
+    space with FRSCA_COMPAT=1 (already small, so scored exactly),
+    else the raw embeddings with optional two-stage retrieval.
+    """
+    if catalog["compat"] is not None:
+        return {"embeddings": catalog["compat"], "unit_embeddings": catalog["compat"]}
+
+    return {
+        "embeddings": catalog["embeddings"],
+        "unit_embeddings": catalog["unit_embeddings"],
+        "signatures": catalog["signatures"],
+        "shortlist": shortlist
+    }
+
+
+def use_shards(level):
+    return coordinator is not None and level == "item"
+
+
+def require_local(feature):
+    """Reject features that need the whole catalog in this process."""
+    if SHARD_DIR:
+        raise HTTPException(
+            status_code=501,
+            detail=f"Not supported in sharded mode: {feature}"
+        )
+
+
+def get_catalog(level):
+    if level != "item":
+        require_local(f"Catalog level '{level}'")
+    if level not in catalogs:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Catalog level '{level}' is not available"
+        )
+    return catalogs[level]
+
+
+def to_product_outfit(outfit):
+    """Map each slot's image to its product's preferred image."""
+    product_names = catalogs["product"]["image_names"]
+    resolved = {}
+    for slot, item in outfit.items():
+        p = image_to_product.get(item["image"])
+        resolved[slot] = item if p is None else {**item, "image": str(product_names[p])}
+    return resolved
+
+
+def expand_views(items, view):
+    """
+    Swap each product's preferred image for the requested view
+    (e.g. "back") when the product has one, from the preferred
+    image's variant if that variant has the view.
+    """
+    products = catalogs["product"]["metadata"]
+    for item in items:
+        product = products[item["id"]]
+        members = sorted(
+            product["members"],
+            key=lambda i: metadata[i].get("variant_id") != product.get("variant_id")
+        )
+        for i in members:
+            if metadata[i].get("view") == view:
+                item["image"] = str(image_names[i])
+                break
+    return items
+
+
+# -----------------------------
+# Outfit sessions
+# -----------------------------
+# /generate-outfit with session=true returns a session id; later
+# calls can send it instead of the whole outfit and swap slots in
+# place. Sessions (like cursors) live in this process only.
+sessions = TTLStore(
+    max_entries=int(os.environ.get("FRSCA_SESSION_MAX", "10000")),
+    ttl=float(os.environ.get("FRSCA_SESSION_TTL", "1800"))
+)
+
+
+def get_session(session_id):
+    require_local("outfit sessions")
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+
+def session_outfit(session):
+    catalog = get_catalog(session.level)
+    return session.outfit(
+        lambda index: build_item(index, catalog["metadata"], catalog["image_names"])
+    )
+
+
+# -----------------------------
+# Paginated slot alternatives
+# -----------------------------
+# /slot-alternatives with paginate=true caches the scored pool as a
+# Ranking and returns a cursor into it; following pages are cut
+# from the cached ranking instead of re-scoring the pool.
+rankings = TTLStore(
+    max_entries=int(os.environ.get("FRSCA_RANKING_MAX", "1000")),
+    ttl=float(os.environ.get("FRSCA_RANKING_TTL", "300"))
+)
+
+# Sharded mode ranks this many alternatives up front
+RANKING_DEPTH = int(os.environ.get("FRSCA_RANKING_DEPTH", "1000"))
+
+
+def get_ranking(cursor):
+    try:
+        ranking_id, offset = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    ranking = rankings.get(ranking_id)
+    if ranking is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Cursor expired; request the first page again"
+        )
+    return ranking_id, ranking, offset
+
+
+def ranking_page(ranking, ranking_id, offset, top_k, exclude_ids):
+    """One page of alternatives plus the cursor to the next page."""
+    positions, next_offset = ranking.page(offset, top_k, exclude_ids)
+
+    if ranking.items is not None:
+        alternatives = [dict(ranking.items[p]) for p in positions]
+    else:
+        catalog = get_catalog(ranking.context["level"])
+        alternatives = [
+            alternative_item(
+                ranking.ids[p], ranking.scores[p],
+                catalog["metadata"], catalog["image_names"]
+            )
+            for p in positions
+        ]
+
+    next_cursor = None
+    if ranking_id is not None and next_offset is not None:
+        next_cursor = encode_cursor(ranking_id, next_offset)
+    return alternatives, next_cursor
+
 
-embeddings = np.load(os.path.join(PROC_DIR, "embeddings.npy"))
-image_names = np.load(
-    os.path.join(PROC_DIR, "image_names.npy"),
-    allow_pickle=True
+# -----------------------------
+# Request profiling (opt-in)
+# -----------------------------
+# FRSCA_PROFILE_RATE samples a fraction of requests; requests whose
+# X-Profile header equals FRSCA_ADMIN_TOKEN are always profiled.
+profile_ring = ProfileRing(
+    directory=os.environ.get("FRSCA_PROFILE_DIR", os.path.join(BASE_DIR, "profiles")),
+    sample_rate=float(os.environ.get("FRSCA_PROFILE_RATE", "0")),
+    admin_token=os.environ.get("FRSCA_ADMIN_TOKEN"),
+    max_entries=int(os.environ.get("FRSCA_PROFILE_MAX", "50"))
 )
 
-with open(os.path.join(PROC_DIR, "metadata.json")) as f:
-    metadata = json.load(f)
+
+def require_admin(request):
+    if not profile_ring.is_admin(request.headers):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+# -----------------------------
+# Response serialization
+# -----------------------------
+# Responses larger than this many bytes are gzip-compressed
+GZIP_MIN_SIZE = int(os.environ.get("FRSCA_GZIP_MIN_SIZE", "1024"))
+
+
+def fast_json(content, headers=None):
+    """
+    Render plain dict/list/str/int/float content straight to JSON,
+    skipping FastAPI's generic jsonable_encoder pass.
+    """
+    if orjson is not None:
+        body = orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+        return Response(body, media_type="application/json", headers=headers)
+    return JSONResponse(content, headers=headers)
+
+
+def build_manifest(catalog):
+    """
+    Compact catalog manifest (id, image, category, gender per row)
+    so clients can resolve ids returned by compact responses.
+    Versioned by the catalog fingerprint when validation ran.
+    """
+    rows = [
+        [i, str(catalog["image_names"][i]), item.get("category"), item.get("gender")]
+        for i, item in enumerate(catalog["metadata"])
+    ]
+    manifest = {
+        "version": catalog["fingerprint"],
+        "count": len(rows),
+        "columns": ["id", "image", "category", "gender"],
+        "items": rows
+    }
+    body = json.dumps(manifest, separators=(",", ":")).encode()
+    return body, catalog["fingerprint"] or hashlib.sha1(body).hexdigest()
+
+
+manifests = {level: build_manifest(catalog) for level, catalog in catalogs.items()}
+
+# -----------------------------
+# Shard workers
+# -----------------------------
+shard_processes = []
+
+
+def start_shards():
+    global coordinator
+    if SHARD_DIR:
+        if VALIDATE:
+            for name, report in validate_shards(SHARD_DIR, IMAGE_DIR, VALIDATE_FILES).items():
+                check_report(f"shard {name}", report)
+
+        authkey = os.urandom(32)
+        index, processes, addresses = start_local_shards(SHARD_DIR, authkey)
+        shard_processes.extend(processes)
+        coordinator = ShardCoordinator(index, addresses, authkey)
+
+
+def stop_shards():
+    if coordinator is not None:
+        coordinator.close()
+    for process in shard_processes:
+        process.terminate()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    start_shards()
+    yield
+    stop_shards()
+
 
 # -----------------------------
 # FastAPI app
 # -----------------------------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # -----------------------------
 # Serve images as static files
 # -----------------------------
-IMAGE_DIR = os.path.join(BASE_DIR, "train_images")
-
 app.mount(
     "/images",
     StaticFiles(directory=IMAGE_DIR),
     name="images"
 )
 
+
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],   # OK for dev
@@ -69,52 +463,377 @@ class GenerateOutfitRequest(BaseModel):
     season: str
     occasion: str
     style: str | None = None
+    compact: bool = False
+    level: str = "item"
+    view: str | None = None
+    # keep the outfit server-side and return its session_id
+    session: bool = False
 
 
 class SlotAlternativesRequest(BaseModel):
-    current_outfit: dict
+    # either the full outfit, or a session_id from /generate-outfit
+    # (gender / season / occasion then default to the session's)
+    current_outfit: dict | None = None
+    session_id: str | None = None
+    slot: str | None = None
+    gender: str | None = None
+    season: str | None = None
+    occasion: str | None = None
+    # page size when paginating; 0 would return a cursor to itself
+    top_k: int = Field(5, gt=0)
+    compact: bool = False
+    level: str = "item"
+    view: str | None = None
+    # pagination: paginate=true returns next_cursor; send it back as
+    # `cursor` (alone) for the next page. exclude_ids are skipped.
+    paginate: bool = False
+    cursor: str | None = None
+    exclude_ids: List[int] = []
+
+
+class ReplaceSlotRequest(BaseModel):
     slot: str
+    image: str
+
+
+class RecommendRequest(BaseModel):
     gender: str
-    season: str
-    occasion: str
-    top_k: int = 5
+    category: str
+    layer: str | None = None
+    coverage: str | None = None
+    structure: str | None = None
+    season: str | None = None
+    style: str | None = None
+    occasion: str | None = None
+    top_k: int = 10
+    compact: bool = False
+    level: str = "item"
+    view: str | None = None
+
+
+# -----------------------------
+# Response schemas
+# -----------------------------
+# With compact=True endpoints return catalog ids (and scores)
+# only; resolve them through GET /catalog-manifest. With
+# level="product" ids are product ids and images are each
+# product's preferred view (or `view`, when it exists).
+
+class OutfitItem(BaseModel):
+    id: int
+    image: str
+    category: str | None = None
+    gender: str | None = None
+
+
+class ScoredItem(OutfitItem):
+    score: float
+
+
+class RecommendedItem(ScoredItem):
+    visual_similarity: float
+    layer: str | None = None
+    coverage: str | None = None
+    structure: str | None = None
+
+
+class GenerateOutfitResponse(BaseModel):
+    outfit: Dict[str, OutfitItem] | None
+    session_id: str | None = None
+
+
+class CompactOutfitResponse(BaseModel):
+    outfit: Dict[str, int] | None
+    session_id: str | None = None
+
+
+class SessionResponse(BaseModel):
+    session_id: str
+    outfit: Dict[str, OutfitItem]
+
+
+class SlotAlternativesResponse(BaseModel):
+    slot: str
+    alternatives: List[ScoredItem]
+    next_cursor: str | None = None
+
+
+class RecommendResponse(BaseModel):
+    results: List[RecommendedItem]
+
+
+class CompactScoresResponse(BaseModel):
+    ids: List[int]
+    scores: List[float]
+
+
+class CompactAlternativesResponse(CompactScoresResponse):
+    slot: str
+    next_cursor: str | None = None
+
+
+def compact_scores(items):
+    return {
+        "ids": [item["id"] for item in items],
+        "scores": [item["score"] for item in items]
+    }
 
 
 # -----------------------------
 # Endpoints
 # -----------------------------
 
-@app.post("/generate-outfit")
-def generate_outfit_api(req: GenerateOutfitRequest):
+@app.post(
+    "/generate-outfit",
+    response_model=GenerateOutfitResponse | CompactOutfitResponse
+)
+def generate_outfit_api(req: GenerateOutfitRequest, request: Request):
+    if req.session:
+        require_local("outfit sessions")
+    catalog = None if use_shards(req.level) else get_catalog(req.level)
     try:
-        outfit = generate_outfit(
-            metadata=metadata,
-            embeddings=embeddings,
-            image_names=image_names,
-            gender=req.gender,
-            season=req.season,
-            occasion=req.occasion,
-            style=req.style
-        )
-        return {"outfit": outfit}
+        with profile_ring.maybe_profile(request.headers, "generate-outfit", req.model_dump()) as stats:
+            if catalog is None:
+                outfit = coordinator.generate_outfit(
+                    gender=req.gender,
+                    season=req.season,
+                    occasion=req.occasion,
+                    style=req.style,
+                    canonical_only=CANONICAL_ONLY,
+                    stats=stats
+                )
+            else:
+                outfit = generate_outfit(
+                    metadata=catalog["metadata"],
+                    image_names=catalog["image_names"],
+                    gender=req.gender,
+                    season=req.season,
+                    occasion=req.occasion,
+                    style=req.style,
+                    canonical_only=CANONICAL_ONLY,
+                    stats=stats,
+                    anchors=catalog["anchors"],
+                    **scoring_args(catalog)
+                )
+        session_id = None
+        if req.session and outfit is not None:
+            context = req.model_dump(include={"gender", "season", "occasion", "style"})
+            session_id = sessions.put(
+                OutfitSession(outfit, scoring_args(catalog)["embeddings"], context, req.level)
+            )
+
+        if req.compact and outfit is not None:
+            outfit = {slot: item["id"] for slot, item in outfit.items()}
+        elif req.level == "product" and req.view and outfit is not None:
+            expand_views(outfit.values(), req.view)
+        return fast_json({"outfit": outfit, "session_id": session_id})
     except Exception as e:
-        return {"error": str(e)}
-
-@app.post("/slot-alternatives")
-def slot_alternatives_api(req: SlotAlternativesRequest):
-    alternatives = recommend_slot_alternatives(
-        current_outfit=req.current_outfit,
-        slot=req.slot,
-        metadata=metadata,
-        embeddings=embeddings,
-        image_names=image_names,
-        gender=req.gender,
-        season=req.season,
-        occasion=req.occasion,
-        top_k=req.top_k
+        raise HTTPException(status_code=500, detail=f"Outfit generation failed: {e}")
+
+@app.post(
+    "/slot-alternatives",
+    response_model=SlotAlternativesResponse | CompactAlternativesResponse
+)
+def slot_alternatives_api(req: SlotAlternativesRequest, request: Request):
+    if req.cursor:
+        ranking_id, ranking, offset = get_ranking(req.cursor)
+        slot, level = ranking.context["slot"], ranking.context["level"]
+        if req.slot and req.slot != slot:
+            raise HTTPException(status_code=400, detail=f"Cursor is for the {slot} slot")
+
+        alternatives, next_cursor = ranking_page(
+            ranking, ranking_id, offset, req.top_k, req.exclude_ids
+        )
+        return alternatives_response(req, slot, level, alternatives, next_cursor)
+
+    if not req.slot:
+        raise HTTPException(status_code=422, detail="'slot' is required")
+
+    session = get_session(req.session_id) if req.session_id else None
+    level = session.level if session else req.level
+    catalog = None if use_shards(level) else get_catalog(level)
+
+    context = {}
+    for key in ("gender", "season", "occasion"):
+        context[key] = getattr(req, key) or (session.context[key] if session else None)
+        if context[key] is None:
+            raise HTTPException(status_code=422, detail=f"'{key}' is required")
+
+    ref_vector = None
+    if session is not None:
+        with session.lock:
+            current_outfit = session_outfit(session)
+            ref_vector = session.reference_vector(req.slot)
+    elif req.current_outfit is not None:
+        current_outfit = req.current_outfit
+        if level == "product":
+            current_outfit = to_product_outfit(current_outfit)
+    else:
+        raise HTTPException(status_code=422, detail="Send current_outfit or session_id")
+
+    if req.slot not in current_outfit:
+        raise HTTPException(status_code=400, detail=f"Outfit has no {req.slot} slot")
+
+    ranked = req.paginate or bool(req.exclude_ids)
+    ranking_context = {"slot": req.slot, "level": level}
+
+    with profile_ring.maybe_profile(request.headers, "slot-alternatives", req.model_dump()) as stats:
+        if catalog is None:
+            alternatives = coordinator.slot_alternatives(
+                current_outfit=current_outfit,
+                slot=req.slot,
+                top_k=RANKING_DEPTH if ranked else req.top_k,
+                canonical_only=CANONICAL_ONLY,
+                stats=stats,
+                **context
+            )
+            if ranked:
+                ranking = Ranking(
+                    [item["id"] for item in alternatives],
+                    [item["score"] for item in alternatives],
+                    context=ranking_context,
+                    items=alternatives
+                )
+        elif ranked:
+            # scored exactly: the ranking is paged, not re-scored
+            candidates, scores = score_slot_candidates(
+                current_outfit=current_outfit,
+                slot=req.slot,
+                metadata=catalog["metadata"],
+                image_names=catalog["image_names"],
+                canonical_only=CANONICAL_ONLY,
+                stats=stats,
+                ref_vector=ref_vector,
+                image_index=catalog["image_index"],
+                **scoring_args(catalog, shortlist=0),
+                **context
+            )
+            ranking = Ranking(candidates, scores, context=ranking_context)
+        else:
+            alternatives = recommend_slot_alternatives(
+                current_outfit=current_outfit,
+                slot=req.slot,
+                metadata=catalog["metadata"],
+                image_names=catalog["image_names"],
+                top_k=req.top_k,
+                canonical_only=CANONICAL_ONLY,
+                stats=stats,
+                ref_vector=ref_vector,
+                image_index=catalog["image_index"],
+                **scoring_args(catalog),
+                **context
+            )
+
+    next_cursor = None
+    if ranked:
+        ranking_id = rankings.put(ranking) if req.paginate else None
+        alternatives, next_cursor = ranking_page(
+            ranking, ranking_id, 0, req.top_k, req.exclude_ids
+        )
+
+    return alternatives_response(req, req.slot, level, alternatives, next_cursor)
+
+
+def alternatives_response(req, slot, level, alternatives, next_cursor):
+    extra = {"next_cursor": next_cursor} if req.paginate or req.cursor else {}
+
+    if req.compact:
+        return fast_json({"slot": slot, **compact_scores(alternatives), **extra})
+
+    if level == "product" and req.view:
+        expand_views(alternatives, req.view)
+
+    return fast_json({
+        "slot": slot,
+        "alternatives": alternatives,
+        **extra
+    })
+
+@app.post(
+    "/recommend",
+    response_model=RecommendResponse | CompactScoresResponse
+)
+def recommend_api(req: RecommendRequest):
+    require_local("/recommend")
+    catalog = get_catalog(req.level)
+    ctx = req.model_dump(exclude={"top_k", "compact", "level", "view"}, exclude_none=True)
+
+    results = recommend(
+        ctx,
+        metadata=catalog["metadata"],
+        embeddings=catalog["embeddings"],
+        image_names=catalog["image_names"],
+        top_k=req.top_k,
+        facets=catalog["facets"],
+        unit_embeddings=catalog["unit_embeddings"],
+        canonical_only=CANONICAL_ONLY
     )
 
-    return {
-        "slot": req.slot,
-        "alternatives": alternatives
-    }
\ No newline at end of file
+    if req.compact:
+        return fast_json(compact_scores(results))
+
+    if req.level == "product" and req.view:
+        expand_views(results, req.view)
+
+    return fast_json({"results": results})
+
+
+@app.get("/catalog-manifest")
+def catalog_manifest_api(request: Request, level: str = "item"):
+    require_local("/catalog-manifest")
+    get_catalog(level)
+    manifest_body, manifest_version = manifests[level]
+
+    headers = {
+        "ETag": f'"{manifest_version}"',
+        "Cache-Control": "public, max-age=3600"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(manifest_body, media_type="application/json", headers=headers)
+
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse)
+def get_session_api(session_id: str):
+    session = get_session(session_id)
+    with session.lock:
+        outfit = session_outfit(session)
+    return fast_json({"session_id": session_id, "outfit": outfit})
+
+
+@app.post("/sessions/{session_id}/replace", response_model=SessionResponse)
+def replace_slot_api(session_id: str, req: ReplaceSlotRequest):
+    """Atomically put the item `image` into `slot` of the session outfit."""
+    session = get_session(session_id)
+    catalog = get_catalog(session.level)
+
+    index = catalog["image_index"].get(req.image)
+    if index is None and session.level == "product":
+        index = image_to_product.get(req.image)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Unknown image")
+
+    if get_slot(catalog["metadata"][index]) != req.slot:
+        raise HTTPException(status_code=400, detail=f"Item does not fit the {req.slot} slot")
+
+    with session.lock:
+        session.replace(req.slot, index)
+        outfit = session_outfit(session)
+
+    return fast_json({"session_id": session_id, "outfit": outfit})
+
+
+@app.get("/admin/profiles")
+def list_profiles_api(request: Request):
+    require_admin(request)
+    return fast_json({"profiles": profile_ring.list()})
+
+
+@app.get("/admin/profiles/{filename}")
+def download_profile_api(filename: str, request: Request):
+    require_admin(request)
+    path = profile_ring.path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=filename)
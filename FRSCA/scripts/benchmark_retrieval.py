@@ -0,0 +1,194 @@
+"""
+Recall / latency benchmark for two-stage retrieval.
+
+Builds slot-alternative queries the way the API does (a random
+outfit from the allowed pools of a random context; the other
+slots' mean embedding is the reference), scores each candidate
+pool exactly and with signature shortlists of several sizes, and
+reports recall@1 / recall@10 of the shortlisted top results
+against the exact ones plus scoring latency.
+
+Uses processed/ (and processed/signatures.npz, built on the fly if
+missing), or a synthetic catalog with --synthetic N.
+
+Usage:
+    python scripts/benchmark_retrieval.py
+    python scripts/benchmark_retrieval.py --synthetic 100000 --shortlists 100,300,1000
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.catalog import normalize_rows, score_rows, top_k_order
+from scripts.generate_outfit import generate_outfit
+from scripts.slot_alternatives import score_slot_candidates
+from scripts.signatures import build_signatures, load_signatures
+from scripts.loadtest import build_synthetic_catalog
+
+PROC_DIR = os.path.join(BASE_DIR, "processed")
+
+SEASONS = ["summer", "winter", "monsoon"]
+OCCASIONS = ["casual", "office", "party"]
+RECALL_AT = (1, 10)
+
+
+def load_catalog(proc_dir):
+    embeddings = np.load(os.path.join(proc_dir, "embeddings.npy"))
+    image_names = np.load(os.path.join(proc_dir, "image_names.npy"), allow_pickle=True)
+    with open(os.path.join(proc_dir, "metadata.json")) as f:
+        metadata = json.load(f)
+    return metadata, embeddings, image_names
+
+
+def slot_pools(context, metadata, embeddings, image_names, image_index):
+    """Allowed candidate rows per active slot for one context."""
+    outfit = generate_outfit(metadata, embeddings, image_names, **context)
+    if outfit is None:
+        return {}
+
+    pools = {}
+    for slot, item in outfit.items():
+        rows, _ = score_slot_candidates(
+            outfit, slot, metadata, embeddings, image_names,
+            image_index=image_index, **context
+        )
+        pools[slot] = np.append(rows, item["id"])
+    return pools
+
+
+def make_queries(metadata, embeddings, image_names, n_queries, seed=0):
+    """
+    (candidate rows, reference vector) pairs: a random outfit drawn
+    from the allowed pools of a random context, and one of its slots.
+    """
+    rng = np.random.default_rng(seed)
+    genders = sorted({item.get("gender") for item in metadata if item.get("gender")})
+    image_index = {str(name): i for i, name in enumerate(image_names)}
+
+    contexts = [
+        {"gender": g, "season": s, "occasion": o}
+        for g in genders for s in SEASONS for o in OCCASIONS
+    ]
+    pools = [slot_pools(c, metadata, embeddings, image_names, image_index) for c in contexts]
+    pools = [p for p in pools if len(p) > 1]
+    if not pools:
+        return []
+
+    queries = []
+    for _ in range(n_queries):
+        slots = pools[rng.integers(len(pools))]
+        outfit = {slot: int(rng.choice(rows)) for slot, rows in slots.items()}
+        slot = rng.choice(list(slots))
+
+        ref = np.mean([embeddings[i] for s, i in outfit.items() if s != slot], axis=0)
+        rows = slots[slot][slots[slot] != outfit[slot]]
+        if len(rows):
+            queries.append((rows, ref))
+
+    return queries
+
+
+def run(metadata, embeddings, image_names, signatures, shortlists, n_queries, repeats):
+    unit = normalize_rows(embeddings)
+    queries = make_queries(metadata, embeddings, image_names, n_queries)
+    if not queries:
+        raise SystemExit("No queries could be built from this catalog")
+
+    def timed(ref, rows, shortlist):
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = score_rows(ref, rows, embeddings, unit, signatures, shortlist)
+            best = min(best, time.perf_counter() - start)
+        return result, best
+
+    report = {"queries": len(queries), "mean_pool": float(np.mean([len(r) for r, _ in queries]))}
+    exact_ms, exact_top = [], []
+
+    for rows, ref in queries:
+        (scored, scores), elapsed = timed(ref, rows, 0)
+        exact_ms.append(elapsed * 1000)
+        exact_top.append(scored[top_k_order(scores, max(RECALL_AT))])
+    report["exact_p50_ms"] = float(np.median(exact_ms))
+
+    report["shortlists"] = []
+    for shortlist in shortlists:
+        latencies, recalls = [], {k: [] for k in RECALL_AT}
+        for (rows, ref), truth in zip(queries, exact_top):
+            (scored, scores), elapsed = timed(ref, rows, shortlist)
+            latencies.append(elapsed * 1000)
+
+            found = scored[top_k_order(scores, max(RECALL_AT))]
+            for k in RECALL_AT:
+                expected = truth[:k]
+                recalls[k].append(len(np.intersect1d(found[:k], expected)) / max(len(expected), 1))
+
+        p50 = float(np.median(latencies))
+        report["shortlists"].append({
+            "shortlist": shortlist,
+            "p50_ms": p50,
+            "speedup": report["exact_p50_ms"] / p50 if p50 else float("nan"),
+            **{f"recall@{k}": float(np.mean(recalls[k])) for k in RECALL_AT}
+        })
+
+    return report
+
+
+def print_report(report):
+    print(f"{report['queries']} queries, mean pool {report['mean_pool']:.0f} candidates")
+    print(f"exact scoring: p50 {report['exact_p50_ms']:.3f} ms\n")
+    print(f"{'shortlist':>9} {'p50 ms':>9} {'speedup':>8} " + " ".join(f"{'recall@' + str(k):>9}" for k in RECALL_AT))
+    for row in report["shortlists"]:
+        recalls = " ".join(f"{row[f'recall@{k}']:>9.3f}" for k in RECALL_AT)
+        print(f"{row['shortlist']:>9} {row['p50_ms']:>9.3f} {row['speedup']:>7.1f}x {recalls}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Two-stage retrieval recall / latency benchmark")
+    parser.add_argument("--shortlists", default="100,300,1000")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3, help="timing runs per query (best is kept)")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N",
+                        help="benchmark a synthetic catalog of N items instead of processed/")
+    parser.add_argument("--dim", type=int, default=2048, help="embedding size for --synthetic")
+    parser.add_argument("--method", choices=["pca", "random"], default="pca",
+                        help="signature method when signatures are built here")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    signatures = None
+    if args.synthetic:
+        # only the arrays are kept; the temp catalog (and its PNGs) goes
+        root = tempfile.mkdtemp(prefix="frsca-retrieval-")
+        try:
+            proc_dir, _, _ = build_synthetic_catalog(root, n_items=args.synthetic, dim=args.dim)
+            metadata, embeddings, image_names = load_catalog(proc_dir)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    else:
+        signatures = load_signatures("signatures.npz", PROC_DIR)
+        metadata, embeddings, image_names = load_catalog(PROC_DIR)
+
+    if signatures is None:
+        signatures = build_signatures(embeddings, method=args.method)
+
+    report = run(
+        metadata, embeddings, image_names, signatures,
+        [int(s) for s in args.shortlists.split(",")],
+        args.queries, args.repeats
+    )
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
@@ -1,13 +1,100 @@
 import os
+import re
 import json
+import sys
 import numpy as np
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.validate_catalog import run as validate_catalogs
+
 PROC_DIR = os.path.join(BASE_DIR, "processed")
 
 embeddings = np.load(os.path.join(PROC_DIR, "embeddings.npy"))
 image_names = np.load(os.path.join(PROC_DIR, "image_names.npy"), allow_pickle=True)
 
+# e.g. MEN-Denim-id_00000089-02_7_additional.png
+#      → product 00000089, variant 02, view 7 ("additional")
+VIEW_PATTERN = re.compile(r"id_(\d+)-(\d+)_(\d+)_([a-z]+)\.\w+$", re.IGNORECASE)
+
+# Which shot represents a product, best first
+VIEW_PREFERENCE = ["front", "full", "side", "flat", "additional", "back"]
+
+
+def parse_view_ids(filename):
+    match = VIEW_PATTERN.search(filename)
+    if not match:
+        return {
+            "product_key": os.path.splitext(filename)[0],
+            "product_id": None,
+            "variant_id": None,
+            "view_id": None,
+            "view": None
+        }
+
+    product_id, variant_id, view_id, view = match.groups()
+    return {
+        # one product = one id within a category folder, all variants
+        # and views together, e.g. MEN-Denim-id_00000089
+        "product_key": filename[:match.start(2) - 1],
+        "product_id": product_id,
+        "variant_id": variant_id,
+        "view_id": int(view_id),
+        "view": view.lower()
+    }
+
+
+def view_rank(view):
+    if view in VIEW_PREFERENCE:
+        return VIEW_PREFERENCE.index(view)
+    return len(VIEW_PREFERENCE)
+
+
+def build_product_table(metadata, embeddings):
+    """
+    Group all variants and views of the same product and pool their
+    embeddings.
+
+    Returns (products, product_embeddings, product_image_names).
+    Each product looks like a metadata item whose "image" is the
+    preferred view (lowest variant on ties), plus the ids of all
+    member images and the list of its variant ids. Every item in
+    metadata gets a "product" index pointing into the table.
+    """
+    groups = {}
+    for item in metadata:
+        groups.setdefault(item["product_key"], []).append(item["id"])
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    unit = embeddings / np.maximum(norms, 1e-12)
+
+    products = []
+    product_embeddings = np.zeros((len(groups), embeddings.shape[1]), dtype=np.float32)
+
+    for p, (key, members) in enumerate(groups.items()):
+        members.sort(key=lambda i: (
+            view_rank(metadata[i]["view"]), metadata[i]["variant_id"] or "", i
+        ))
+        preferred = metadata[members[0]]
+
+        product_embeddings[p] = unit[members].mean(axis=0)
+
+        products.append({
+            **{k: v for k, v in preferred.items() if k not in ("view_id", "view")},
+            "id": p,
+            "image": preferred["image"],
+            "members": members,
+            "variants": sorted({metadata[i]["variant_id"] for i in members if metadata[i]["variant_id"]})
+        })
+
+        for i in members:
+            metadata[i]["product"] = p
+
+    product_image_names = np.array([product["image"] for product in products], dtype=object)
+    return products, product_embeddings, product_image_names
+
+
 def map_filename_to_metadata(filename):
     name = filename.lower()
 
@@ -136,13 +223,33 @@ for idx, img_name in enumerate(image_names):
     metadata.append({
         "id": idx,
         "image": img_name,
-        **attrs
+        **attrs,
+        **parse_view_ids(img_name)
     })
 
 
+# -----------------------------
+# Product-level table (pooled views)
+# -----------------------------
+products, product_embeddings, product_image_names = build_product_table(metadata, embeddings)
+
+np.save(os.path.join(PROC_DIR, "product_embeddings.npy"), product_embeddings)
+np.save(os.path.join(PROC_DIR, "product_image_names.npy"), product_image_names)
+
+with open(os.path.join(PROC_DIR, "products.json"), "w") as f:
+    json.dump(products, f, indent=2)
+
+
 out_path = os.path.join(PROC_DIR, "metadata.json")
 
 with open(out_path, "w") as f:
     json.dump(metadata, f, indent=2)
 
 print("✅ Metadata file created:", out_path)
+print(f"✅ Product table created: {len(metadata)} images → {len(products)} products")
+
+
+# -----------------------------
+# Integrity check + fingerprint
+# -----------------------------
+validate_catalogs()
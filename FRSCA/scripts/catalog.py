@@ -0,0 +1,107 @@
+"""
+Vectorized catalog helpers.
+
+Precomputes per-item attribute columns and unit-length
+embeddings once, so request handlers can filter and score
+a whole candidate pool with array operations instead of
+per-item Python loops.
+"""
+
+import numpy as np
+
+# -----------------------------
+# Attribute columns
+# -----------------------------
+
+FACET_KEYS = ("gender", "category", "subcategory", "layer", "coverage", "structure", "fit")
+
+
+def build_facets(metadata):
+    """
+    Turn metadata into column arrays (one entry per item).
+    Usage tags become boolean columns ("usage:formal", ...).
+    """
+    facets = {
+        key: np.array([item.get(key, "") for item in metadata], dtype=object)
+        for key in FACET_KEYS
+    }
+
+    # representatives of near-duplicate clusters (see scripts/dedup.py)
+    facets["canonical"] = np.array(
+        [item.get("canonical_id", i) == i for i, item in enumerate(metadata)], dtype=bool
+    )
+
+    usage_tags = sorted({tag for item in metadata for tag in item.get("usage", [])})
+    for tag in usage_tags:
+        facets["usage:" + tag] = np.array(
+            [tag in item.get("usage", []) for item in metadata], dtype=bool
+        )
+
+    return facets
+
+
+def usage_mask(facets, tag):
+    """Boolean mask of items tagged with a usage value."""
+    mask = facets.get("usage:" + tag)
+    if mask is None:
+        return np.zeros(len(facets["gender"]), dtype=bool)
+    return mask
+
+
+# -----------------------------
+# Scoring
+# -----------------------------
+
+def normalize_rows(embeddings):
+    """Return float32 unit-length rows (zero rows stay zero)."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def unit_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return vector
+    return vector / norm
+
+
+def top_k_order(scores, top_k):
+    """
+    Positions of the top_k highest scores, best first.
+    Uses argpartition so only the selected slice is sorted.
+    """
+    n = len(scores)
+    if top_k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if top_k < n:
+        part = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        part = np.arange(n)
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def score_rows(ref_vector, rows, embeddings, unit_embeddings=None, signatures=None, shortlist=0):
+    """
+    Cosine similarity of ref_vector to each catalog row in `rows`.
+    Returns (rows, scores).
+
+    With a SignatureIndex (scripts/signatures.py) and a shortlist
+    smaller than the pool, the pool is first ranked on the cheap
+    signatures and only the best `shortlist` rows (kept in their
+    original order) are scored on the full embeddings.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    ref = unit_vector(ref_vector)
+
+    if signatures is not None and 0 < shortlist < len(rows):
+        coarse = signatures.vectors[rows] @ signatures.query(ref)
+        rows = rows[np.sort(np.argpartition(-coarse, shortlist - 1)[:shortlist])]
+
+    if unit_embeddings is None:
+        vectors = normalize_rows(embeddings[rows])
+    else:
+        vectors = unit_embeddings[rows]
+    return rows, vectors @ ref
@@ -0,0 +1,445 @@
+"""
+Learned compatibility projection (NumPy only).
+
+Raw ResNet similarity says two items *look* alike, not that they
+go together. This trains a linear projection W (D → 128) so that
+normalize((unit(x) - mean) @ W) puts compatible TOP / BOTTOM /
+OUTERWEAR items close together:
+
+- positives: items of two different slots with the same gender and
+  a shared usage tag (casual, formal, cold), plus items of one
+  product that span two slots (real co-occurrence, rare here)
+- loss: symmetric InfoNCE over in-batch negatives, gradients
+  written out by hand, Adam updates, PCA initialisation. In-batch
+  pairs the positive rule also calls compatible are masked out of
+  the logits, so they are never pushed apart as negatives
+- items are split by gender and product id, so both halves of a
+  product that spans two slots stay on one side. Held-out items
+  report the loss and, as a check that does not reuse the
+  usage-tag rule, how often a held-out product's item in one slot
+  finds its partner in the other slot among its 10 nearest (raw
+  cosine vs learned space)
+
+The usage-tag rule only encodes gender, slot and tag, which serving
+already filters on, so the learned space is not trusted by default:
+compat_rejection() refuses it unless the held-out check covers at
+least MIN_EVAL_PAIRS pairs and beats raw cosine.
+
+Run after build_metadata.py. Writes processed/compat_projection.npz
+and processed/compat_embeddings.npz (unit rows, same order as
+embeddings.npy), plus product_compat_embeddings.npz for the
+product table; all record the training report and the latter two
+the catalog fingerprint. With FRSCA_COMPAT=1 the API scores outfits
+and slot alternatives in this space, and refuses to start if
+compat_rejection() rejects the report.
+
+Usage:
+    python scripts/compat_projection.py [--dim 128] [--steps 2000]
+"""
+
+import os
+import sys
+import json
+import argparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.slots import get_slot
+from scripts.catalog import normalize_rows
+from scripts.signatures import fit_projection
+from scripts.validate_catalog import catalog_fingerprint, read_fingerprint
+
+PROC_DIR = os.path.join(BASE_DIR, "processed")
+
+COMPAT_SLOTS = ("TOP", "BOTTOM", "OUTERWEAR")
+COMPAT_DIM = 128
+
+# held-out co-occurring pairs needed before recall@10 is trusted
+MIN_EVAL_PAIRS = 20
+
+PROJECTION_FILE = "compat_projection.npz"
+# level: (embeddings, projected vectors)
+CATALOG_FILES = {
+    "item": ("embeddings.npy", "compat_embeddings.npz"),
+    "product": ("product_embeddings.npy", "product_compat_embeddings.npz")
+}
+
+
+class CompatProjection:
+
+    def __init__(self, mean, weights):
+        self.mean = mean          # (D,) mean unit embedding
+        self.weights = weights    # (D, d)
+
+    def project(self, embeddings):
+        """Unit-length compatibility vectors for raw embeddings."""
+        return normalize_rows((normalize_rows(embeddings) - self.mean) @ self.weights)
+
+    def save(self, path, report=None):
+        np.savez(path, mean=self.mean, weights=self.weights, report=dump_report(report))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["mean"], data["weights"])
+
+
+def dump_report(report):
+    return np.array(json.dumps(report))
+
+
+def read_report(data):
+    """Training report stored in a loaded npz (None if absent)."""
+    return json.loads(str(data["report"])) if "report" in data.files else None
+
+
+def load_compat_embeddings(filename, proc_dir=PROC_DIR):
+    """
+    (projected catalog as unit rows, catalog fingerprint it was
+    built from, training report), or None if it was not trained.
+    """
+    path = os.path.join(proc_dir, filename)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return data["vectors"], read_fingerprint(data), read_report(data)
+
+
+def compat_rejection(report):
+    """
+    Why the learned space must not be served, or None when the
+    held-out co-occurrence check shows it beating raw cosine.
+    """
+    if not report:
+        return "it has no training report; re-run scripts/compat_projection.py"
+
+    pairs = report.get("held_out_cooccurring_pairs", 0)
+    if pairs < MIN_EVAL_PAIRS:
+        return (
+            f"only {pairs} held-out cross-slot product pairs (need {MIN_EVAL_PAIRS}), "
+            "so it could not be checked against raw cosine"
+        )
+
+    raw = report["cooccurrence_recall@10_raw"]
+    learned = report["cooccurrence_recall@10_learned"]
+    if not learned > raw:
+        return f"held-out recall@10 is {learned:.3f} learned vs {raw:.3f} raw cosine"
+
+    return None
+
+
+# -----------------------------
+# Positive pairs
+# -----------------------------
+
+def pair_groups(metadata, rows):
+    """
+    Rule-derived positives as (slot A rows, slot B rows) groups: any
+    item of A with any item of B, where both share gender and a
+    usage tag and A, B are different slots.
+    """
+    groups = {}
+    for i in rows:
+        item = metadata[i]
+        slot = get_slot(item)
+        if slot not in COMPAT_SLOTS:
+            continue
+        for tag in item.get("usage", []):
+            key = (item.get("gender"), tag)
+            groups.setdefault(key, {}).setdefault(slot, []).append(i)
+
+    return [
+        (np.array(slots[a]), np.array(slots[b]))
+        for slots in groups.values()
+        for n, a in enumerate(COMPAT_SLOTS)
+        for b in COMPAT_SLOTS[n + 1:]
+        if a in slots and b in slots
+    ]
+
+
+def cooccurrence_pairs(metadata, rows):
+    """Items of one product_id that fall into two different slots."""
+    by_product = {}
+    for i in rows:
+        item = metadata[i]
+        if item.get("product_id") and get_slot(item) in COMPAT_SLOTS:
+            by_product.setdefault((item.get("gender"), item["product_id"]), []).append(i)
+
+    pairs = []
+    for items in by_product.values():
+        for a in items:
+            for b in items:
+                if a < b and get_slot(metadata[a]) != get_slot(metadata[b]):
+                    pairs.append((a, b))
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+
+def rule_codes(metadata):
+    """Per-item gender, slot and usage-tag bitmask codes for rule_mask."""
+    def codes(values):
+        index = {v: n for n, v in enumerate(sorted(set(values)))}
+        return np.array([index[v] for v in values])
+
+    tags = sorted({tag for item in metadata for tag in item.get("usage", [])})
+    usage = np.array([
+        sum(1 << tags.index(tag) for tag in set(item.get("usage", [])))
+        for item in metadata
+    ], dtype=np.int64)
+
+    return (
+        codes([str(item.get("gender")) for item in metadata]),
+        codes([str(get_slot(item)) for item in metadata]),
+        usage
+    )
+
+
+def rule_mask(a, b, codes):
+    """
+    (len(a), len(b)) mask of off-diagonal pairs that the positive
+    rule calls compatible: in-batch false negatives.
+    """
+    gender, slot, usage = codes
+    mask = (
+        (gender[a][:, None] == gender[b][None, :])
+        & (slot[a][:, None] != slot[b][None, :])
+        & ((usage[a][:, None] & usage[b][None, :]) != 0)
+    )
+    np.fill_diagonal(mask, False)
+    return mask
+
+
+def sample_pairs(groups, cooccurring, batch_size, rng):
+    """batch_size (anchor, positive) row pairs."""
+    sizes = np.array([len(a) + len(b) for a, b in groups], dtype=float)
+    picks = rng.choice(len(groups), size=batch_size, p=sizes / sizes.sum())
+
+    pairs = np.empty((batch_size, 2), dtype=np.int64)
+    for g in np.unique(picks):
+        at = np.flatnonzero(picks == g)
+        a, b = groups[g]
+        pairs[at, 0] = a[rng.integers(len(a), size=len(at))]
+        pairs[at, 1] = b[rng.integers(len(b), size=len(at))]
+
+    # mix in real co-occurrence when there is any
+    if len(cooccurring):
+        n_real = min(len(cooccurring), batch_size // 8)
+        pairs[:n_real] = cooccurring[rng.choice(len(cooccurring), n_real)]
+
+    return pairs
+
+
+# -----------------------------
+# Model
+# -----------------------------
+
+def forward(x, weights):
+    z = x @ weights
+    norms = np.linalg.norm(z, axis=1, keepdims=True) + 1e-8
+    return z / norms, norms
+
+
+def info_nce(xa, xb, weights, temperature, mask=None):
+    """
+    Symmetric InfoNCE loss and its gradient w.r.t. weights. Pairs
+    set in `mask` (never the diagonal) are left out of the softmax.
+    """
+    fa, na = forward(xa, weights)
+    fb, nb = forward(xb, weights)
+    batch = len(xa)
+
+    logits = fa @ fb.T / temperature
+    if mask is not None:
+        logits = np.where(mask, -np.inf, logits)
+    labels = np.arange(batch)
+
+    def softmax(x):
+        e = np.exp(x - x.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+    p_ab = softmax(logits)
+    p_ba = softmax(logits.T)
+    loss = -0.5 * (
+        np.log(p_ab[labels, labels] + 1e-12).mean()
+        + np.log(p_ba[labels, labels] + 1e-12).mean()
+    )
+
+    # d loss / d logits
+    eye = np.eye(batch, dtype=logits.dtype)
+    d_logits = 0.5 * ((p_ab - eye) + (p_ba - eye).T) / batch
+
+    d_fa = d_logits @ fb / temperature
+    d_fb = d_logits.T @ fa / temperature
+
+    # back through row normalisation
+    d_za = (d_fa - fa * (d_fa * fa).sum(axis=1, keepdims=True)) / na
+    d_zb = (d_fb - fb * (d_fb * fb).sum(axis=1, keepdims=True)) / nb
+
+    return loss, xa.T @ d_za + xb.T @ d_zb
+
+
+def cooccurrence_recall(metadata, vectors, pairs, k=10):
+    """
+    For each co-occurring pair (a, b), whether b is among the k
+    items of its slot and gender closest to a, and vice versa.
+    """
+    pools = {}
+    for i, item in enumerate(metadata):
+        pools.setdefault((item.get("gender"), get_slot(item)), []).append(i)
+    pools = {key: np.array(rows) for key, rows in pools.items()}
+
+    hits = []
+    for a, b in pairs:
+        for query, target in ((a, b), (b, a)):
+            item = metadata[target]
+            pool = pools[(item.get("gender"), get_slot(item))]
+            scores = vectors[pool] @ vectors[query]
+            hits.append((scores > vectors[target] @ vectors[query]).sum() < k)
+
+    return float(np.mean(hits)) if hits else float("nan")
+
+
+def train(
+    metadata,
+    embeddings,
+    dim=COMPAT_DIM,
+    steps=2000,
+    batch_size=256,
+    lr=1e-3,
+    temperature=0.1,
+    weight_decay=1e-4,
+    holdout=0.1,
+    seed=0
+):
+    """Returns (CompatProjection, report dict)."""
+    rng = np.random.default_rng(seed)
+
+    unit = normalize_rows(embeddings)
+    mean = unit.mean(axis=0)
+    x = unit - mean
+
+    # split by product id so all images of a product, in every slot
+    # it spans, stay on one side
+    def product(item):
+        return f"{item.get('gender')}/{item.get('product_id') or item['image']}"
+
+    products = sorted({product(item) for item in metadata})
+    held = set(rng.choice(products, size=int(len(products) * holdout), replace=False))
+    is_held = np.array([product(item) in held for item in metadata])
+    train_rows = np.flatnonzero(~is_held)
+    test_rows = np.flatnonzero(is_held)
+
+    train_groups = pair_groups(metadata, train_rows)
+    test_groups = pair_groups(metadata, test_rows)
+    if not train_groups:
+        raise ValueError("No positive pairs: need TOP / BOTTOM / OUTERWEAR items sharing a usage tag")
+    cooccurring = cooccurrence_pairs(metadata, train_rows)
+    held_out_cooccurring = cooccurrence_pairs(metadata, test_rows)
+    codes = rule_codes(metadata)
+
+    def batch_loss(pairs, w):
+        a, b = pairs[:, 0], pairs[:, 1]
+        return info_nce(x[a], x[b], w, temperature, rule_mask(a, b, codes))
+
+    dim = min(dim, x.shape[1])
+    weights = fit_projection(x, dim, "pca", seed)
+
+    def held_out_loss(w):
+        if not test_groups:
+            return float("nan")
+        eval_rng = np.random.default_rng(seed + 1)
+        losses = []
+        for _ in range(10):
+            pairs = sample_pairs(test_groups, [], batch_size, eval_rng)
+            losses.append(batch_loss(pairs, w)[0])
+        return float(np.mean(losses))
+
+    report = {
+        "pairs_from_cooccurrence": len(cooccurring),
+        "held_out_loss_initial": held_out_loss(weights)
+    }
+
+    # Adam
+    m = np.zeros_like(weights)
+    v = np.zeros_like(weights)
+    beta1, beta2 = 0.9, 0.999
+
+    for step in range(1, steps + 1):
+        pairs = sample_pairs(train_groups, cooccurring, batch_size, rng)
+        loss, grad = batch_loss(pairs, weights)
+        grad += weight_decay * weights
+
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad ** 2
+        weights -= lr * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + 1e-8)
+
+        if step % 500 == 0 or step == steps:
+            print(f"step {step:>5}: train loss {loss:.4f}")
+
+    projection = CompatProjection(mean, weights)
+
+    report["held_out_loss"] = held_out_loss(weights)
+    report["held_out_cooccurring_pairs"] = len(held_out_cooccurring)
+    report["cooccurrence_recall@10_raw"] = cooccurrence_recall(
+        metadata, unit, held_out_cooccurring
+    )
+    report["cooccurrence_recall@10_learned"] = cooccurrence_recall(
+        metadata, projection.project(embeddings), held_out_cooccurring
+    )
+    return projection, report
+
+
+def write_compat_embeddings(projection, report, proc_dir=PROC_DIR):
+    """
+    Project every catalog level in proc_dir and save it with its
+    fingerprint and the training report.
+    """
+    written = []
+    for level, (embeddings_file, out_file) in CATALOG_FILES.items():
+        path = os.path.join(proc_dir, embeddings_file)
+        if not os.path.exists(path):
+            continue
+        np.savez(
+            os.path.join(proc_dir, out_file),
+            vectors=projection.project(np.load(path)),
+            fingerprint=np.array(catalog_fingerprint(proc_dir, level)),
+            report=dump_report(report)
+        )
+        written.append(out_file)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the compatibility projection")
+    parser.add_argument("--dim", type=int, default=COMPAT_DIM)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--temperature", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    embeddings = np.load(os.path.join(PROC_DIR, "embeddings.npy"))
+    with open(os.path.join(PROC_DIR, "metadata.json")) as f:
+        metadata = json.load(f)
+
+    projection, report = train(
+        metadata, embeddings,
+        dim=args.dim,
+        steps=args.steps,
+        batch_size=args.batch_size,
+        lr=args.lr,
+        temperature=args.temperature,
+        seed=args.seed
+    )
+    for key, value in report.items():
+        print(f"{key:>30}: {value:.4f}" if isinstance(value, float) else f"{key:>30}: {value}")
+
+    projection.save(os.path.join(PROC_DIR, PROJECTION_FILE), report)
+    for out_file in write_compat_embeddings(projection, report, PROC_DIR):
+        print("✅ Saved", out_file)
+
+    rejection = compat_rejection(report)
+    if rejection:
+        print(f"⚠️  The API will refuse FRSCA_COMPAT=1: {rejection}")
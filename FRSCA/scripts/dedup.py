@@ -0,0 +1,128 @@
+"""
+Near-duplicate collapsing for the catalog.
+
+Run after extract_embeddings.py and build_metadata.py.
+Items of the same gender and slot whose embeddings are more
+similar than SIMILARITY_THRESHOLD are grouped into clusters,
+and every item gets a "canonical_id" pointing at the cluster's
+representative (the member closest to all others). Serving can
+then score representatives only.
+"""
+
+import os
+import sys
+import json
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.slots import get_slot
+from scripts.catalog import normalize_rows
+from scripts.validate_catalog import run as validate_catalogs
+
+PROC_DIR = os.path.join(BASE_DIR, "processed")
+
+SIMILARITY_THRESHOLD = 0.95
+BLOCK_SIZE = 2048
+
+
+# -----------------------------
+# Pair search (blocked)
+# -----------------------------
+
+def find_duplicate_pairs(unit, threshold=SIMILARITY_THRESHOLD, block_size=BLOCK_SIZE):
+    """
+    Return (rows, cols) of all pairs i < j with cosine similarity
+    above threshold. The similarity matrix is walked in
+    block_size x block_size tiles on and above the diagonal, so
+    memory stays constant whatever the group size.
+    """
+    rows, cols = [], []
+    n = len(unit)
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+
+        for col_start in range(start, n, block_size):
+            col_stop = min(col_start + block_size, n)
+            sims = unit[start:stop] @ unit[col_start:col_stop].T
+
+            # diagonal tile: keep the upper triangle only (j > i)
+            if col_start == start:
+                sims[np.tril_indices(stop - start, m=col_stop - col_start)] = -1.0
+
+            r, c = np.nonzero(sims > threshold)
+            rows.append(r + start)
+            cols.append(c + col_start)
+
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(cols)
+
+
+def cluster_duplicates(unit, threshold=SIMILARITY_THRESHOLD, block_size=BLOCK_SIZE):
+    """
+    Cluster items connected by above-threshold pairs.
+    Returns one canonical (representative) local index per item.
+    """
+    n = len(unit)
+    rows, cols = find_duplicate_pairs(unit, threshold, block_size)
+
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+
+    canonical = np.arange(n)
+    order = np.argsort(labels, kind="stable")
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+
+    for members in np.split(order, bounds):
+        if len(members) < 2:
+            continue
+        # medoid: member with the highest total similarity to the others
+        sub = unit[members]
+        centrality = sub @ sub.sum(axis=0)
+        canonical[members] = members[np.argmax(centrality)]
+
+    return canonical
+
+
+def dedup_catalog(metadata, embeddings, threshold=SIMILARITY_THRESHOLD, block_size=BLOCK_SIZE):
+    """
+    Add "canonical_id" to every metadata item. Items are only
+    compared within the same (gender, slot) group.
+    """
+    unit = normalize_rows(embeddings)
+
+    groups = {}
+    for i, item in enumerate(metadata):
+        groups.setdefault((item.get("gender"), get_slot(item)), []).append(i)
+
+    for indices in groups.values():
+        indices = np.asarray(indices)
+        canonical = cluster_duplicates(unit[indices], threshold, block_size)
+        for i, c in zip(indices, indices[canonical]):
+            metadata[i]["canonical_id"] = int(c)
+
+    return metadata
+
+
+if __name__ == "__main__":
+    embeddings = np.load(os.path.join(PROC_DIR, "embeddings.npy"))
+    meta_path = os.path.join(PROC_DIR, "metadata.json")
+
+    with open(meta_path) as f:
+        metadata = json.load(f)
+
+    dedup_catalog(metadata, embeddings)
+
+    with open(meta_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    n_canonical = sum(item["canonical_id"] == i for i, item in enumerate(metadata))
+    print(f"✅ Deduplicated catalog: {len(metadata)} items → {n_canonical} representatives")
+
+    # canonical_id changed metadata.json, so refresh the fingerprint
+    validate_catalogs()
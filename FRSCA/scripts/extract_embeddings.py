@@ -1,4 +1,7 @@
 import os
+import sys
+import time
+import argparse
 import numpy as np
 import torch
 from PIL import Image
@@ -6,77 +9,271 @@ from tqdm import tqdm
 
 from torchvision.models import resnet50, ResNet50_Weights
 import torch.nn as nn
-from torchvision import transforms
 
 
 # -----------------------------
 # Paths (Windows-safe)
 # -----------------------------
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.feature_extractor import get_transform, get_normalize
+from scripts.preprocess_cache import ImageCache
+
 IMG_DIR = os.path.join(BASE_DIR, "train_images")
 OUT_DIR = os.path.join(BASE_DIR, "processed")
 
-os.makedirs(OUT_DIR, exist_ok=True)
-
 
 # -----------------------------
 # Model (Feature Extractor)
 # -----------------------------
-weights = ResNet50_Weights.DEFAULT
-model = resnet50(weights=weights)
-model.fc = nn.Identity()
-model.eval()
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = model.to(device)
+def build_model():
+    weights = ResNet50_Weights.DEFAULT
+    model = resnet50(weights=weights)
+    model.fc = nn.Identity()
+    model.eval()
+    return model
 
 
 # -----------------------------
 # Image Transform
 # -----------------------------
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),
-    transforms.ToTensor(),
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],
-        std=[0.229, 0.224, 0.225]
-    )
-])
+transform = get_transform()
+normalize = get_normalize()
 
 
-# -----------------------------
-# Extraction Loop
-# -----------------------------
-embeddings = []
-image_names = []
+def from_cached_pixels(pixels):
+    """HWC uint8 → normalized CHW float, same as ToTensor + Normalize."""
+    tensor = torch.from_numpy(np.array(pixels)).permute(2, 0, 1)
+    return normalize(tensor.float().div_(255))
 
-image_files = os.listdir(IMG_DIR)
 
-print(f"Found {len(image_files)} images")
+def load_batches(image_files, batch_size, cache=None):
+    """
+    Yield (names, tensor) batches, skipping unreadable images.
+    With an ImageCache, cached images skip decode and resize.
+    """
+    names, tensors = [], []
 
-with torch.no_grad():
-    for img_name in tqdm(image_files):
+    for img_name in image_files:
         img_path = os.path.join(IMG_DIR, img_name)
+        row = cache.row(IMG_DIR, img_name) if cache is not None else None
 
         try:
-            img = Image.open(img_path).convert("RGB")
-            img_tensor = transform(img).unsqueeze(0).to(device)
-
-            emb = model(img_tensor)
-            embeddings.append(emb.squeeze().cpu().numpy())
-            image_names.append(img_name)
-
+            if row is not None:
+                tensors.append(from_cached_pixels(cache.pixels[row]))
+            else:
+                img = Image.open(img_path).convert("RGB")
+                tensors.append(transform(img))
+            names.append(img_name)
         except Exception as e:
             print(f"Skipping {img_name}: {e}")
+            continue
+
+        if len(tensors) == batch_size:
+            yield names, torch.stack(tensors)
+            names, tensors = [], []
+
+    if tensors:
+        yield names, torch.stack(tensors)
 
 
 # -----------------------------
-# Save to Disk
+# CPU inference optimizations
 # -----------------------------
-embeddings = np.array(embeddings)
+def optimize_for_cpu(
+    model,
+    quantize="none",
+    channels_last=False,
+    graph="eager",
+    calibration_batches=()
+):
+    """
+    Apply the selected CPU optimizations to a float32 model.
+
+    quantize:      "none" | "static" (FX int8, calibrated on the batches).
+                   There is no dynamic mode: it only quantizes
+                   nn.Linear, and ResNet-50 without its fc head has none.
+    channels_last: NHWC memory format for conv-heavy models
+    graph:         "eager" | "compile" (torch.compile)
+                   | "torchscript" (trace + freeze)
+    """
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    if quantize == "static":
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+        example = (torch.randn(1, 3, 224, 224),)
+        prepared = prepare_fx(model, get_default_qconfig_mapping("x86"), example)
+        with torch.no_grad():
+            for batch in calibration_batches:
+                prepared(to_memory_format(batch, channels_last))
+        model = convert_fx(prepared)
+
+    if graph == "compile":
+        model = torch.compile(model)
+    elif graph == "torchscript":
+        example = to_memory_format(torch.randn(1, 3, 224, 224), channels_last)
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+            model = torch.jit.freeze(traced)
+
+    return model
+
+
+def to_memory_format(batch, channels_last):
+    if channels_last:
+        return batch.contiguous(memory_format=torch.channels_last)
+    return batch
+
+
+def extract(model, image_files, batch_size, channels_last=False, device="cpu", cache=None):
+    """
+    Run the model over image_files; returns (embeddings, names, images/sec).
+    The first batch is run once untimed so compile/trace warm-up
+    does not count against throughput.
+    """
+    embeddings = []
+    image_names = []
+    elapsed = 0.0
+    warmed_up = False
+
+    with torch.no_grad():
+        for names, batch in tqdm(
+            load_batches(image_files, batch_size, cache),
+            total=(len(image_files) + batch_size - 1) // batch_size
+        ):
+            batch = to_memory_format(batch.to(device), channels_last)
+
+            if not warmed_up:
+                model(batch)
+                warmed_up = True
+
+            start = time.perf_counter()
+            emb = model(batch)
+            elapsed += time.perf_counter() - start
+
+            embeddings.append(emb.reshape(len(names), -1).cpu().numpy())
+            image_names.extend(names)
+
+    embeddings = np.concatenate(embeddings) if embeddings else np.empty((0, 2048))
+    throughput = len(image_names) / elapsed if elapsed else 0.0
+    return embeddings, image_names, throughput
+
+
+def cosine_agreement(a, b):
+    """Row-wise cosine similarity between two embedding matrices."""
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return np.sum(a * b, axis=1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract ResNet-50 embeddings")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--quantize", choices=["none", "static"], default="none")
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--graph", choices=["eager", "compile", "torchscript"], default="eager")
+    parser.add_argument("--intra-op-threads", type=int, default=None)
+    parser.add_argument("--inter-op-threads", type=int, default=None)
+    parser.add_argument(
+        "--calibration-images", type=int, default=256,
+        help="images used to calibrate static quantization"
+    )
+    parser.add_argument(
+        "--from-cache", action="store_true",
+        help="stream preprocessed pixels from scripts/preprocess_cache.py"
+    )
+    parser.add_argument(
+        "--benchmark", type=int, default=0, metavar="N",
+        help="compare against the float32 baseline on N images and exit"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Thread pools must be sized before the first parallel op runs
+    if args.inter_op_threads:
+        torch.set_num_interop_threads(args.inter_op_threads)
+    if args.intra_op_threads:
+        torch.set_num_threads(args.intra_op_threads)
+
+    optimized = (
+        args.quantize != "none" or args.channels_last or args.graph != "eager"
+    )
+    device = torch.device(
+        "cuda" if torch.cuda.is_available() and not optimized else "cpu"
+    )
+
+    image_files = sorted(os.listdir(IMG_DIR))
+    print(f"Found {len(image_files)} images")
+
+    # static quantization calibrates on the first images; in benchmark
+    # mode those come from after the benchmark slice, so agreement is
+    # measured on images the quantizer has not seen
+    calibration_files = image_files[:args.calibration_images]
+    if args.benchmark:
+        calibration_files = image_files[args.benchmark:args.benchmark + args.calibration_images]
+        image_files = image_files[:args.benchmark]
+        if args.quantize == "static" and not calibration_files:
+            raise SystemExit("No images left after the benchmark slice to calibrate on")
+
+    cache = ImageCache(OUT_DIR) if args.from_cache else None
+
+    model = build_model().to(device)
+
+    if optimized:
+        calibration = [
+            batch for _, batch in load_batches(
+                calibration_files, args.batch_size, cache
+            )
+        ] if args.quantize == "static" else []
+        fast_model = optimize_for_cpu(
+            build_model() if args.benchmark else model,
+            quantize=args.quantize,
+            channels_last=args.channels_last,
+            graph=args.graph,
+            calibration_batches=calibration
+        )
+    else:
+        fast_model = model
+
+    # -----------------------------
+    # Benchmark mode: speed vs float32 drift
+    # -----------------------------
+    if args.benchmark:
+        base_emb, _, base_ips = extract(
+            model, image_files, args.batch_size, device=device, cache=cache
+        )
+        fast_emb, _, fast_ips = extract(
+            fast_model, image_files, args.batch_size, args.channels_last, device, cache
+        )
+        agreement = cosine_agreement(base_emb, fast_emb)
+
+        print(f"float32 baseline : {base_ips:8.1f} images/s")
+        print(f"optimized        : {fast_ips:8.1f} images/s ({fast_ips / base_ips:.2f}x)")
+        print(f"cosine agreement : mean {agreement.mean():.5f}  min {agreement.min():.5f}")
+        raise SystemExit(0)
+
+    # -----------------------------
+    # Extraction Loop
+    # -----------------------------
+    embeddings, image_names, ips = extract(
+        fast_model, image_files, args.batch_size, args.channels_last, device, cache
+    )
+
+    # -----------------------------
+    # Save to Disk
+    # -----------------------------
+    os.makedirs(OUT_DIR, exist_ok=True)
 
-np.save(os.path.join(OUT_DIR, "embeddings.npy"), embeddings)
-np.save(os.path.join(OUT_DIR, "image_names.npy"), image_names)
+    np.save(os.path.join(OUT_DIR, "embeddings.npy"), embeddings)
+    np.save(os.path.join(OUT_DIR, "image_names.npy"), image_names)
 
-print("✅ Embedding extraction completed")
-print("Embeddings shape:", embeddings.shape)
+    print("✅ Embedding extraction completed")
+    print("Embeddings shape:", embeddings.shape)
+    print(f"Throughput: {ips:.1f} images/s")
@@ -1,13 +1,11 @@
 import torch
-from torchvision.models import resnet50, ResNet50_Weights
 import torch.nn as nn
 import torchvision.models as models
 from torchvision import transforms
 
-weights = ResNet50_Weights.DEFAULT
-model = resnet50(weights=weights)
-model.fc = nn.Identity()
-model.eval()
+IMAGE_SIZE = 224
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
 
 # Load ResNet-50
 def get_resnet():
@@ -17,14 +15,19 @@ def get_resnet():
     return model
 
 # Image preprocessing
+# Split in two so the decode + resize step can be cached
+# (scripts/preprocess_cache.py) and only normalization re-run.
+def get_resize():
+    return transforms.Resize((IMAGE_SIZE, IMAGE_SIZE))
+
+def get_normalize():
+    return transforms.Normalize(mean=MEAN, std=STD)
+
 def get_transform():
     return transforms.Compose([
-        transforms.Resize((224, 224)),
+        get_resize(),
         transforms.ToTensor(),
-        transforms.Normalize(
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
-        )
+        get_normalize()
     ])
 if __name__ == "__main__":
     from PIL import Image
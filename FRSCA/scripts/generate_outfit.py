@@ -1,8 +1,18 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from scripts.slots import get_slot
-from scripts.rules import item_allowed
+from scripts.rules import item_allowed, SEASON_RULES, OCCASION_RULES
+from scripts.catalog import score_rows
+
+
+def active_slots(season):
+    """Slots filled for a season (NO FOOTWEAR)."""
+    slots = ["TOP", "BOTTOM"]
+
+    if season == "winter":
+        slots.append("OUTERWEAR")
+
+    return slots
 
 
 def generate_outfit(
@@ -12,15 +22,29 @@ def generate_outfit(
     gender,
     season,
     occasion,
-    style=None
+    style=None,
+    canonical_only=False,
+    stats=None,
+    unit_embeddings=None,
+    signatures=None,
+    shortlist=0,
+    anchors=None
 ):
+    """
+    If `stats` is a dict it receives the candidate pool size per
+    slot (used by the request profiler).
+
+    unit_embeddings / signatures / shortlist are passed to
+    catalog.score_rows (two-stage retrieval when a shortlist is
+    set). The anchor only depends on the context, so `anchors`
+    (an optional dict the caller keeps per catalog) caches it,
+    scored exactly once. Only contexts with a known season and
+    occasion rule are cached, which keeps the cache bounded.
+    """
     # -----------------------------
     # 1. Decide active slots (NO FOOTWEAR)
     # -----------------------------
-    slots = ["TOP", "BOTTOM"]
-
-    if season == "winter":
-        slots.append("OUTERWEAR")
+    slots = active_slots(season)
 
     # -----------------------------
     # 2. Build candidate pools per slot
@@ -31,6 +55,10 @@ def generate_outfit(
         if item.get("gender") != gender:
             continue
 
+        # skip near-duplicates collapsed by scripts/dedup.py
+        if canonical_only and item.get("canonical_id", i) != i:
+            continue
+
         slot = get_slot(item)
         if slot not in slots:
             continue
@@ -40,27 +68,30 @@ def generate_outfit(
 
         slot_candidates[slot].append(i)
 
+    if stats is not None:
+        stats["pool_sizes"] = {slot: len(c) for slot, c in slot_candidates.items()}
+
     # -----------------------------
     # 3. Pick TOP as anchor
     # -----------------------------
     anchor_indices = slot_candidates["TOP"]
 
-    anchor_vectors = [embeddings[i] for i in anchor_indices]
-    anchor_centroid = np.mean(anchor_vectors, axis=0)
-
-    anchor_scores = []
-    for i in anchor_indices:
-        sim = cosine_similarity(
-            [anchor_centroid], [embeddings[i]]
-        )[0][0]
-        anchor_scores.append((i, sim))
+    if not anchor_indices:
+        return None
 
-    anchor_scores.sort(key=lambda x: x[1], reverse=True)
+    if season not in SEASON_RULES or occasion not in OCCASION_RULES:
+        anchors = None
 
-    if not anchor_scores:
-        return None
-    
-    anchor_index = anchor_scores[0][0]
+    key = (gender, season, occasion, canonical_only)
+    anchor_index = None if anchors is None else anchors.get(key)
+    if anchor_index is None:
+        anchor_centroid = embeddings[anchor_indices].mean(axis=0)
+        rows, scores = score_rows(
+            anchor_centroid, anchor_indices, embeddings, unit_embeddings
+        )
+        anchor_index = rows[np.argmax(scores)]
+        if anchors is not None:
+            anchors[key] = anchor_index
 
     outfit = {
         "TOP": build_item(anchor_index, metadata, image_names)
@@ -81,15 +112,11 @@ def generate_outfit(
 
         ref_vector = np.mean(reference_vectors, axis=0)
 
-        scored = []
-        for i in candidates:
-            sim = cosine_similarity(
-                [ref_vector], [embeddings[i]]
-            )[0][0]
-            scored.append((i, sim))
-
-        scored.sort(key=lambda x: x[1], reverse=True)
-        best_index = scored[0][0]
+        rows, scores = score_rows(
+            ref_vector, candidates, embeddings,
+            unit_embeddings, signatures, shortlist
+        )
+        best_index = rows[np.argmax(scores)]
 
         outfit[slot] = build_item(best_index, metadata, image_names)
         reference_vectors.append(embeddings[best_index])
@@ -100,7 +127,8 @@ def generate_outfit(
 def build_item(index, metadata, image_names):
     item = metadata[index]
     return {
-        "image": image_names[index],
+        "id": int(index),
+        "image": str(image_names[index]),
         "category": item.get("category"),
         "gender": item.get("gender")
     }
\ No newline at end of file
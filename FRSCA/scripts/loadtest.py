@@ -0,0 +1,448 @@
+"""
+Load-testing harness for the FastAPI service.
+
+Builds a synthetic catalog, starts api/main.py under uvicorn
+against it, and replays an open-loop traffic mix of
+/generate-outfit, /slot-alternatives and /images at one or
+more arrival rates. Arrivals are Poisson and do not wait for
+earlier requests to finish, so queueing shows up as latency
+instead of silently lowering the offered load.
+
+For every rate it reports achieved throughput, latency
+percentiles, error rate and the server's CPU and memory use.
+Extra server settings (worker count, FRSCA_* env vars) let
+configurations be compared run against run.
+
+Requires httpx; psutil is used for resource usage when
+installed (otherwise /proc is read on Linux).
+
+Usage:
+    python scripts/loadtest.py --rates 10,20,40 --duration 20
+    python scripts/loadtest.py --workers 4 --env FRSCA_CANONICAL_ONLY=1
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import struct
+import asyncio
+import argparse
+import shutil
+import tempfile
+import subprocess
+
+import numpy as np
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.signatures import write_signatures
+
+# (gender, folder, category, subcategory, layer, usage)
+SYNTHETIC_FOLDERS = [
+    ("MEN", "Tees_Tanks", "top", "tees", "inner", ["casual"]),
+    ("MEN", "Shirts_Polos", "top", "shirts", "inner", ["formal", "casual"]),
+    ("MEN", "Pants", "bottom", "pants", "inner", ["formal", "casual"]),
+    ("MEN", "Denim", "bottom", "denim", "inner", ["casual"]),
+    ("MEN", "Jackets_Vests", "outerwear", "jackets", "outer", ["cold", "formal"]),
+    ("WOMEN", "Blouses_Shirts", "top", "blouses", "inner", ["formal", "casual"]),
+    ("WOMEN", "Tees_Tanks", "top", "tees", "inner", ["casual"]),
+    ("WOMEN", "Skirts", "bottom", "skirts", "inner", ["casual"]),
+    ("WOMEN", "Pants", "bottom", "pants", "inner", ["formal", "casual"]),
+    ("WOMEN", "Jackets_Coats", "outerwear", "coats", "outer", ["cold", "formal"]),
+]
+
+VIEWS = ["1_front", "2_side", "3_back", "4_full", "7_additional"]
+
+DEFAULT_MIX = {"generate": 0.3, "slots": 0.5, "images": 0.2}
+
+
+# -----------------------------
+# Synthetic catalog
+# -----------------------------
+
+def tiny_png(side=64, seed=0):
+    """A valid side x side RGB noise PNG (roughly side*side*3 bytes)."""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, 256, size=(side, side * 3), dtype=np.uint8)
+    raw = b"".join(b"\x00" + row.tobytes() for row in rows)
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    header = struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def build_synthetic_catalog(root, n_items=10000, dim=2048, n_styles=200, seed=0):
+    """
+    Write processed/ and train_images/ under root. Embeddings are
+    drawn around n_styles random centres so similarity search has
+    realistic structure. All images share one small PNG payload.
+    Two-stage retrieval signatures are written too, so runs with
+    FRSCA_SHORTLIST=0 and without can be compared.
+    """
+    rng = np.random.default_rng(seed)
+    proc_dir = os.path.join(root, "processed")
+    image_dir = os.path.join(root, "train_images")
+    os.makedirs(proc_dir, exist_ok=True)
+    os.makedirs(image_dir, exist_ok=True)
+
+    centres = rng.normal(size=(n_styles, dim)).astype(np.float32)
+    styles = rng.integers(0, n_styles, size=n_items)
+    embeddings = centres[styles] + 0.5 * rng.normal(size=(n_items, dim)).astype(np.float32)
+    embeddings = np.abs(embeddings)  # ReLU-pooled features are non-negative
+
+    png = tiny_png(seed=seed)
+    metadata, image_names = [], []
+
+    for i in range(n_items):
+        gender, folder, category, subcategory, layer, usage = SYNTHETIC_FOLDERS[i % len(SYNTHETIC_FOLDERS)]
+        name = f"{gender}-{folder}-id_{i // 4:08d}-{i % 4 + 1:02d}_{random.Random(i).choice(VIEWS)}.png"
+
+        metadata.append({
+            "id": i,
+            "image": name,
+            "gender": gender.lower(),
+            "category": category,
+            "subcategory": subcategory,
+            "layer": layer,
+            "coverage": "long",
+            "structure": "structured" if category == "outerwear" else "unstructured",
+            "fit": "regular",
+            "usage": usage
+        })
+        image_names.append(name)
+
+        with open(os.path.join(image_dir, name), "wb") as f:
+            f.write(png)
+
+    np.save(os.path.join(proc_dir, "embeddings.npy"), embeddings)
+    np.save(os.path.join(proc_dir, "image_names.npy"), np.array(image_names, dtype=object))
+    with open(os.path.join(proc_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f)
+    write_signatures(proc_dir)
+
+    return proc_dir, image_dir, image_names
+
+
+# -----------------------------
+# Server under test
+# -----------------------------
+
+def start_server(proc_dir, image_dir, port, workers=1, extra_env=None):
+    env = dict(os.environ)
+    env.update(extra_env or {})
+    env["FRSCA_PROC_DIR"] = proc_dir
+    env["FRSCA_IMAGE_DIR"] = image_dir
+
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--app-dir", os.path.join(BASE_DIR, "api"),
+            "--port", str(port),
+            "--workers", str(workers),
+            "--log-level", "warning",
+        ],
+        env=env,
+        cwd=BASE_DIR,
+    )
+
+
+async def wait_until_ready(base_url, server, timeout=120):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError("Server exited during startup")
+            try:
+                if (await client.get(base_url + "/openapi.json")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise TimeoutError("Server did not become ready")
+
+
+class ResourceSampler:
+    """Samples CPU time and RSS of the server and its worker processes."""
+
+    def __init__(self, pid):
+        self.pid = pid
+
+    def _pids(self):
+        if psutil is not None:
+            parent = psutil.Process(self.pid)
+            return [parent.pid] + [c.pid for c in parent.children(recursive=True)]
+
+        pids, queue = [], [self.pid]
+        while queue:
+            pid = queue.pop()
+            pids.append(pid)
+            try:
+                with open(f"/proc/{pid}/task/{pid}/children") as f:
+                    queue.extend(int(c) for c in f.read().split())
+            except OSError:
+                pass
+        return pids
+
+    def sample(self):
+        """Returns (cpu_seconds, rss_bytes) summed over server processes."""
+        cpu, rss = 0.0, 0
+        for pid in self._pids():
+            try:
+                if psutil is not None:
+                    proc = psutil.Process(pid)
+                    times = proc.cpu_times()
+                    cpu += times.user + times.system
+                    rss += proc.memory_info().rss
+                else:
+                    with open(f"/proc/{pid}/stat") as f:
+                        fields = f.read().rsplit(")", 1)[1].split()
+                    cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+                    rss += int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+            except Exception:
+                # the worker exited between listing and sampling
+                continue
+        return cpu, rss
+
+
+# -----------------------------
+# Traffic
+# -----------------------------
+
+class Traffic:
+    """Builds random requests for each endpoint of the mix."""
+
+    def __init__(self, image_names, seed=0):
+        self.rng = random.Random(seed)
+        self.image_names = image_names
+        self.outfits = []
+
+    def context(self):
+        return {
+            "gender": self.rng.choice(["men", "women"]),
+            "season": self.rng.choice(["summer", "winter"]),
+            "occasion": self.rng.choice(["casual", "formal"]),
+        }
+
+    async def generate(self, client):
+        ctx = self.context()
+        response = await client.post("/generate-outfit", json=ctx)
+        outfit = response.json().get("outfit") if response.status_code == 200 else None
+        if outfit:
+            self.outfits.append((ctx, outfit))
+            del self.outfits[:-200]
+        return response
+
+    async def slots(self, client):
+        if not self.outfits:
+            return await self.generate(client)
+        ctx, outfit = self.rng.choice(self.outfits)
+        return await client.post("/slot-alternatives", json={
+            **ctx,
+            "current_outfit": outfit,
+            "slot": self.rng.choice(list(outfit)),
+            "top_k": 5,
+        })
+
+    async def images(self, client):
+        return await client.get("/images/" + self.rng.choice(self.image_names))
+
+
+async def run_rate(base_url, traffic, mix, rate, duration, sampler, timeout=30.0):
+    """Open-loop run at `rate` requests/second for `duration` seconds."""
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    results = []
+
+    async def fire(client, kind):
+        start = time.perf_counter()
+        try:
+            response = await getattr(traffic, kind)(client)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        results.append((kind, time.perf_counter() - start, ok))
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        cpu_start, _ = sampler.sample()
+        peak_rss = 0
+        wall_start = time.perf_counter()
+        next_arrival = wall_start
+        tasks = []
+
+        while next_arrival - wall_start < duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            kind = traffic.rng.choices(kinds, weights)[0]
+            tasks.append(asyncio.create_task(fire(client, kind)))
+            next_arrival += traffic.rng.expovariate(rate)
+
+            if len(tasks) % 50 == 0:
+                peak_rss = max(peak_rss, sampler.sample()[1])
+
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - wall_start
+        cpu_end, rss = sampler.sample()
+
+    return summarize(results, rate, wall, cpu_end - cpu_start, max(peak_rss, rss))
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000) if len(latencies) else float("nan")
+
+
+def summarize(results, rate, wall, cpu_seconds, peak_rss):
+    latencies = np.array([lat for _, lat, _ in results])
+    errors = sum(not ok for _, _, ok in results)
+
+    per_endpoint = {}
+    for kind in sorted({kind for kind, _, _ in results}):
+        lat = np.array([l for k, l, _ in results if k == kind])
+        per_endpoint[kind] = {
+            "count": len(lat),
+            "p50_ms": percentile_ms(lat, 50),
+            "p95_ms": percentile_ms(lat, 95),
+        }
+
+    return {
+        "offered_rps": rate,
+        "achieved_rps": len(results) / wall if wall else 0.0,
+        "requests": len(results),
+        "error_rate": errors / len(results) if results else 0.0,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        "server_cpu_pct": 100.0 * cpu_seconds / wall if wall else 0.0,
+        "server_peak_rss_mb": peak_rss / 2**20,
+        "endpoints": per_endpoint,
+    }
+
+
+def print_report(rows):
+    print(
+        f"{'offered':>8} {'achieved':>9} {'err%':>6} {'p50ms':>8} {'p95ms':>8} "
+        f"{'p99ms':>8} {'cpu%':>7} {'rssMB':>8}"
+    )
+    for row in rows:
+        print(
+            f"{row['offered_rps']:8.1f} {row['achieved_rps']:9.1f} "
+            f"{100 * row['error_rate']:6.2f} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f} "
+            f"{row['p99_ms']:8.1f} {row['server_cpu_pct']:7.1f} {row['server_peak_rss_mb']:8.1f}"
+        )
+        for kind, stats in row["endpoints"].items():
+            print(
+                f"{'':8} {kind:>9}: n={stats['count']:<6} "
+                f"p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms"
+            )
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, weight = part.split("=")
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Open-loop load test for the FRSCA API")
+    parser.add_argument("--items", type=int, default=10000, help="synthetic catalog size")
+    parser.add_argument("--dim", type=int, default=2048, help="embedding dimension")
+    parser.add_argument("--rates", default="5,10,20,40", help="comma-separated requests/second")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per rate")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="e.g. generate=0.3,slots=0.5,images=0.2")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--env", action="append", default=[],
+                        help="extra server env var KEY=VALUE (repeatable)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data-dir", default=None,
+                        help="reuse/keep the synthetic catalog here (default: a temp dir "
+                             "deleted after the run)")
+    parser.add_argument("--json", default=None, help="also write results to this file")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+async def main(args):
+    root = args.data_dir or tempfile.mkdtemp(prefix="frsca-loadtest-")
+    try:
+        await run_catalog(args, root)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+async def run_catalog(args, root):
+    proc_dir = os.path.join(root, "processed")
+
+    if os.path.exists(os.path.join(proc_dir, "metadata.json")):
+        image_names = [str(n) for n in np.load(os.path.join(proc_dir, "image_names.npy"), allow_pickle=True)]
+        image_dir = os.path.join(root, "train_images")
+    else:
+        print(f"Building synthetic catalog: {args.items} items x {args.dim} dims in {root}")
+        proc_dir, image_dir, image_names = build_synthetic_catalog(
+            root, args.items, args.dim, seed=args.seed
+        )
+
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    server = start_server(proc_dir, image_dir, args.port, args.workers, extra_env)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        await wait_until_ready(base_url, server)
+        sampler = ResourceSampler(server.pid)
+        traffic = Traffic(image_names, seed=args.seed)
+
+        rows = []
+        for rate in [float(r) for r in args.rates.split(",")]:
+            print(f"→ {rate:.1f} req/s for {args.duration:.0f}s")
+            rows.append(await run_rate(base_url, traffic, args.mix, rate, args.duration, sampler))
+
+        print()
+        print(f"workers={args.workers} env={extra_env or {}} mix={args.mix}")
+        print_report(rows)
+
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({
+                    "workers": args.workers,
+                    "env": extra_env,
+                    "mix": args.mix,
+                    "items": len(image_names),
+                    "results": rows,
+                }, f, indent=2)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    if httpx is None:
+        sys.exit("loadtest.py requires httpx: pip install httpx")
+    asyncio.run(main(parse_args()))
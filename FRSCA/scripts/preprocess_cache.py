@@ -0,0 +1,166 @@
+"""
+Decoded-image preprocessing cache.
+
+Decodes and resizes every image in train_images/ once and stores
+the 224x224 RGB uint8 pixels in a flat memory-mapped file
+(processed/image_cache.u8), one row per distinct image content.
+A JSON index maps content hash → row and file name → (size,
+mtime, hash), so unchanged files are not even re-hashed.
+
+Later extract_embeddings.py runs (--from-cache) stream batches
+straight from the memmap and only apply ToTensor + normalization,
+so new backbones or normalization settings skip JPEG/PNG decode.
+
+Usage:
+    python scripts/preprocess_cache.py [--workers 8]
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.feature_extractor import IMAGE_SIZE, get_resize
+
+IMG_DIR = os.path.join(BASE_DIR, "train_images")
+PROC_DIR = os.path.join(BASE_DIR, "processed")
+
+CACHE_FILE = "image_cache.u8"
+INDEX_FILE = "image_cache.json"
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def content_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def decode(path, resize):
+    img = Image.open(path).convert("RGB")
+    return np.asarray(resize(img), dtype=np.uint8)
+
+
+class ImageCache:
+    """Read side of the cache: name → HWC uint8 pixels."""
+
+    def __init__(self, cache_dir=PROC_DIR):
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            self.index = json.load(f)
+
+        size = self.index["size"]
+        if self.index["rows"] == 0:
+            self.pixels = np.empty((0, size, size, 3), dtype=np.uint8)
+        else:
+            self.pixels = np.memmap(
+                os.path.join(cache_dir, CACHE_FILE),
+                dtype=np.uint8,
+                mode="r",
+                shape=(self.index["rows"], size, size, 3)
+            )
+
+    def row(self, image_dir, name):
+        """Cache row for a file, or None if it is missing or has changed."""
+        entry = self.index["files"].get(name)
+        if entry is None:
+            return None
+        try:
+            if file_signature(os.path.join(image_dir, name)) != entry[:2]:
+                return None
+        except OSError:
+            return None
+        return self.index["hashes"][entry[2]]
+
+
+def build_cache(image_dir=IMG_DIR, cache_dir=PROC_DIR, workers=8):
+    """
+    Add every new or changed image to the cache. Existing rows are
+    kept; identical content shares one row.
+    """
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+        if index["size"] != IMAGE_SIZE:
+            raise ValueError(
+                f"Cache holds {index['size']}px images; delete it to rebuild at {IMAGE_SIZE}px"
+            )
+    else:
+        index = {"size": IMAGE_SIZE, "rows": 0, "hashes": {}, "files": {}}
+
+    names = sorted(os.listdir(image_dir))
+    resize = get_resize()
+
+    def scan(name):
+        path = os.path.join(image_dir, name)
+        signature = file_signature(path)
+        entry = index["files"].get(name)
+        if entry is not None and entry[:2] == signature:
+            return name, signature, entry[2]
+        return name, signature, content_hash(path)
+
+    def load(item):
+        name, digest = item
+        try:
+            return digest, decode(os.path.join(image_dir, name), resize)
+        except Exception as e:
+            print(f"Skipping {name}: {e}")
+            return digest, None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    added = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        scanned = list(tqdm(pool.map(scan, names), total=len(names), desc="hash"))
+
+        todo, queued = [], set()
+        for name, signature, digest in scanned:
+            index["files"][name] = signature + [digest]
+            if digest not in index["hashes"] and digest not in queued:
+                todo.append((name, digest))
+                queued.add(digest)
+
+        with open(os.path.join(cache_dir, CACHE_FILE), "ab") as out:
+            # drop rows a previous interrupted run wrote but never indexed
+            out.truncate(index["rows"] * IMAGE_SIZE * IMAGE_SIZE * 3)
+
+            for digest, pixels in tqdm(pool.map(load, todo), total=len(todo), desc="decode"):
+                if pixels is None:
+                    continue
+                out.write(pixels.tobytes())
+                index["hashes"][digest] = index["rows"]
+                index["rows"] += 1
+                added += 1
+
+    # forget files that failed to decode or no longer exist
+    present = set(names)
+    index["files"] = {
+        name: entry for name, entry in index["files"].items()
+        if name in present and entry[2] in index["hashes"]
+    }
+
+    with open(index_path, "w") as f:
+        json.dump(index, f)
+
+    return added, index["rows"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the decoded-image cache")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    added, rows = build_cache(workers=args.workers)
+    print(f"✅ Image cache updated: {added} new rows, {rows} total")
@@ -0,0 +1,164 @@
+"""
+On-demand request profiling.
+
+A request is profiled when it is randomly sampled (sample_rate)
+or carries the admin token in the X-Profile header. Profiles are
+written to a bounded on-disk ring buffer: each entry is a profile
+file plus a JSON sidecar with the request context, pool sizes and
+wall time. The oldest entries are deleted once max_entries is
+exceeded.
+
+pyinstrument (a low-overhead sampling profiler) is used when
+installed; otherwise the stdlib cProfile is used. Only one request
+per process is profiled at a time (Python 3.12+ refuses a second
+active cProfile), and profiler errors never fail the request.
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import cProfile
+import threading
+from contextlib import contextmanager
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:
+    SamplingProfiler = None
+
+PROFILE_HEADER = "x-profile"
+
+
+class ProfileRing:
+
+    def __init__(self, directory, sample_rate=0.0, admin_token=None, max_entries=50):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+
+    # -----------------------------
+    # Triggering
+    # -----------------------------
+
+    def is_admin(self, headers):
+        return bool(self.admin_token) and headers.get(PROFILE_HEADER) == self.admin_token
+
+    def should_profile(self, headers):
+        if self.is_admin(headers):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextmanager
+    def maybe_profile(self, headers, endpoint, context):
+        """
+        Yields a stats dict the handler can fill (e.g. pool_sizes).
+        When the request is selected, the body runs under the
+        profiler and the result is stored in the ring buffer. If
+        another request is being profiled, or the profiler cannot
+        start, the body runs unprofiled.
+        """
+        stats = {}
+        if not self.should_profile(headers) or not self._active.acquire(blocking=False):
+            yield stats
+            return
+
+        try:
+            if SamplingProfiler is not None:
+                profiler = SamplingProfiler(interval=0.001)
+                start_profiler, stop_profiler = profiler.start, profiler.stop
+            else:
+                profiler = cProfile.Profile()
+                start_profiler, stop_profiler = profiler.enable, profiler.disable
+            start_profiler()
+        except Exception as e:
+            # e.g. a debugger or coverage tool already owns the profiling hook
+            self._active.release()
+            print(f"⚠️  Profiling skipped for {endpoint}: {e}")
+            profiler = None
+
+        if profiler is None:
+            yield stats
+            return
+
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            try:
+                stop_profiler()
+                elapsed = time.perf_counter() - start
+                self.save(profiler, endpoint, context, stats, elapsed)
+            except Exception as e:
+                print(f"⚠️  Profile for {endpoint} not saved: {e}")
+            finally:
+                self._active.release()
+
+    # -----------------------------
+    # Ring buffer
+    # -----------------------------
+
+    def save(self, profiler, endpoint, context, stats, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{uuid.uuid4().hex[:8]}"
+
+        if SamplingProfiler is not None:
+            profile_file = name + ".html"
+            with open(os.path.join(self.directory, profile_file), "w") as f:
+                f.write(profiler.output_html())
+        else:
+            profile_file = name + ".prof"
+            profiler.dump_stats(os.path.join(self.directory, profile_file))
+
+        meta = {
+            "name": name,
+            "endpoint": endpoint,
+            "created": time.time(),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "context": context,
+            "pool_sizes": stats.get("pool_sizes"),
+            "profile_file": profile_file
+        }
+        with open(os.path.join(self.directory, name + ".json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            entries = self.list()
+            for meta in entries[self.max_entries:]:
+                for filename in (meta["name"] + ".json", meta["profile_file"]):
+                    try:
+                        os.remove(os.path.join(self.directory, filename))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self):
+        """Stored profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+        entries.sort(key=lambda meta: meta["created"], reverse=True)
+        return entries
+
+    def path(self, filename):
+        """Absolute path of a stored profile file, or None."""
+        if os.path.basename(filename) != filename:
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
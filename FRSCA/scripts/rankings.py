@@ -0,0 +1,109 @@
+"""
+Cached rankings for paginated results.
+
+A Ranking holds the scores of a whole candidate pool and sorts it
+lazily: each extension argpartitions the still-unsorted remainder
+for the next chunk (at least double the sorted prefix) and sorts
+only that chunk. Browsing page after page therefore never sorts
+the full pool up front, and once a page's positions are sorted,
+serving it costs O(page size).
+
+Clients page with an opaque cursor (ranking id + offset into the
+sorted order). Items the client has already seen or rejected are
+skipped while walking the order, so exclusions never trigger a
+re-score.
+"""
+
+import base64
+import threading
+
+import numpy as np
+
+from scripts.catalog import top_k_order
+
+MIN_CHUNK = 64
+
+
+class Ranking:
+
+    def __init__(self, ids, scores, context=None, items=None):
+        """
+        ids:     candidate ids, aligned with scores
+        context: what the ranking was built for (slot, level, ...)
+        items:   optional result dicts aligned with ids, for rankings
+                 whose items cannot be rebuilt locally (sharded mode)
+        """
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.context = context or {}
+        self.items = items
+
+        self.order = np.empty(0, dtype=np.int64)   # sorted positions so far
+        self._rest = np.arange(len(self.ids))      # positions not yet sorted
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _extend(self, upto):
+        """Make sure the first `upto` positions of the order are sorted."""
+        upto = min(upto, len(self.ids))
+        while len(self.order) < upto:
+            chunk = max(upto - len(self.order), 2 * len(self.order), MIN_CHUNK)
+            best = top_k_order(self.scores[self._rest], chunk)
+
+            self.order = np.concatenate([self.order, self._rest[best]])
+            keep = np.ones(len(self._rest), dtype=bool)
+            keep[best] = False
+            self._rest = self._rest[keep]
+
+    def page(self, offset, limit, exclude=()):
+        """
+        Up to `limit` positions starting at `offset` in score order,
+        skipping excluded ids. Returns (positions, next offset), the
+        next offset being None once the ranking is exhausted.
+        """
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+
+        exclude = np.asarray(list(exclude), dtype=np.int64)
+        taken = []
+        found = 0
+
+        with self._lock:
+            while found < limit and offset < len(self.ids):
+                stop = offset + (limit - found)
+                self._extend(stop)
+
+                window = self.order[offset:stop]
+                if len(exclude):
+                    window = window[~np.isin(self.ids[window], exclude)]
+                taken.append(window)
+                found += len(window)
+                offset = stop
+
+        positions = np.concatenate(taken) if taken else np.empty(0, dtype=np.int64)
+        next_offset = offset if offset < len(self.ids) else None
+        return positions, next_offset
+
+
+# -----------------------------
+# Cursors
+# -----------------------------
+
+def encode_cursor(ranking_id, offset):
+    raw = f"{ranking_id}:{offset}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(ranking id, offset); raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ranking_id, offset = raw.rsplit(":", 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Malformed cursor") from e
+    if offset < 0 or not ranking_id:
+        raise ValueError("Malformed cursor")
+    return ranking_id, offset
@@ -1,33 +1,58 @@
 import os
+import sys
 import json
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-PROC_DIR = os.path.join(BASE_DIR, "processed")
+sys.path.append(BASE_DIR)
 
-embeddings = np.load(os.path.join(PROC_DIR, "embeddings.npy"))
-image_names = np.load(os.path.join(PROC_DIR, "image_names.npy"), allow_pickle=True)
+from scripts.rules import SEASON_RULES, STYLE_PREFERENCES
+from scripts.catalog import (
+    build_facets,
+    normalize_rows,
+    unit_vector,
+    top_k_order,
+    usage_mask,
+)
 
-with open(os.path.join(PROC_DIR, "metadata.json")) as f:
-    metadata = json.load(f)
+COVERAGE_BONUS = 0.05
+CONTEXT_WEIGHT = 0.05
 
-def context_score(item, ctx):
-    score = 0
 
-    if item["season"] == ctx["season"] or item["season"] == "all":
-        score += 1
-    if item["style"] == ctx["style"]:
-        score += 1
-    if item["occasion"] == ctx["occasion"]:
-        score += 1
-
-    return score / 3  # normalized (0.0 → 1.0)
-
-def build_context_vector(indices):
-    return np.mean([embeddings[i] for i in indices], axis=0)
-
-def recommend(ctx, top_k=10):
+def context_scores(facets, ctx, indices):
+    """
+    Soft match between the items at `indices` and the season / style /
+    occasion in ctx, using the attributes metadata.json actually has.
+    Normalized to 0.0 → 1.0.
+    """
+    score = np.zeros(len(indices), dtype=np.float32)
+
+    allowed = SEASON_RULES.get(ctx.get("season"), {}).get("allowed_coverage")
+    if allowed:
+        score += np.isin(facets["coverage"][indices], list(allowed))
+
+    preferred = STYLE_PREFERENCES.get(ctx.get("style"), {}).get("preferred_fit", set())
+    style_match = np.isin(facets["fit"][indices], list(preferred))
+    if ctx.get("style"):
+        style_match |= usage_mask(facets, ctx["style"])[indices]
+    score += style_match
+
+    if ctx.get("occasion"):
+        score += usage_mask(facets, ctx["occasion"])[indices]
+
+    return score / 3
+
+
+def recommend(
+    ctx,
+    metadata,
+    embeddings,
+    image_names,
+    top_k=10,
+    facets=None,
+    unit_embeddings=None,
+    canonical_only=False
+):
     """
     ctx example:
     {
@@ -37,61 +62,52 @@ def recommend(ctx, top_k=10):
       "coverage": "long",
       "structure": "structured"
     }
-    """
 
-    # ---------- STEP 1: HARD FILTER ----------
-    candidates = []
-    for i, item in enumerate(metadata):
-        if (
-            item["gender"] == ctx["gender"]
-            and item["category"] == ctx["category"]
-            and item["layer"] == ctx["layer"]
-        ):
-            candidates.append(i)
-
-    # Fallback: relax layer
-    if not candidates:
-        for i, item in enumerate(metadata):
-            if (
-                item["gender"] == ctx["gender"]
-                and item["category"] == ctx["category"]
-            ):
-                candidates.append(i)
-
-    # Absolute fallback: same category only
-    if not candidates:
-        for i, item in enumerate(metadata):
-            if item["category"] == ctx["category"]:
-                candidates.append(i)
-
-    if not candidates:
+    facets / unit_embeddings can be precomputed once with
+    build_facets / normalize_rows and reused across calls.
+    """
+    if facets is None:
+        facets = build_facets(metadata)
+    if unit_embeddings is None:
+        unit_embeddings = normalize_rows(embeddings)
+
+    # ---------- STEP 1: HARD FILTER (all tiers in one pass) ----------
+    same_category = facets["category"] == ctx.get("category")
+    if canonical_only:
+        same_category &= facets["canonical"]
+    same_gender = same_category & (facets["gender"] == ctx.get("gender"))
+    same_layer = same_gender & (facets["layer"] == ctx.get("layer"))
+
+    # exact match → relax layer → same category only
+    for mask in (same_layer, same_gender, same_category):
+        candidates = np.flatnonzero(mask)
+        if len(candidates):
+            break
+    else:
         return []
 
     # ---------- STEP 2: REFERENCE VECTOR ----------
-    ref_vector = np.mean(
-        [embeddings[i] for i in candidates],
-        axis=0
-    )
+    ref_vector = unit_vector(np.mean(embeddings[candidates], axis=0))
 
     # ---------- STEP 3: SCORE & RANK ----------
-    results = []
-    for i in candidates:
-        item = metadata[i]
-
-        visual_sim = cosine_similarity(
-            [ref_vector], [embeddings[i]]
-        )[0][0]
+    visual_sim = unit_embeddings[candidates] @ ref_vector
 
-        soft_bonus = 0
-        if "coverage" in ctx and item["coverage"] == ctx["coverage"]:
-            soft_bonus += 0.05
-
-        final_score = visual_sim + soft_bonus
+    final_score = visual_sim.copy()
+    if "coverage" in ctx:
+        final_score += COVERAGE_BONUS * (facets["coverage"][candidates] == ctx["coverage"])
+    if any(ctx.get(k) for k in ("season", "style", "occasion")):
+        final_score += CONTEXT_WEIGHT * context_scores(facets, ctx, candidates)
 
+    # ---------- STEP 4: BUILD TOP-K ONLY ----------
+    results = []
+    for pos in top_k_order(final_score, top_k):
+        i = candidates[pos]
+        item = metadata[i]
         results.append({
-            "image": image_names[i],
-            "score": float(final_score),
-            "visual_similarity": float(visual_sim),
+            "id": int(i),
+            "image": str(image_names[i]),
+            "score": float(final_score[pos]),
+            "visual_similarity": float(visual_sim[pos]),
             "gender": item["gender"],
             "category": item["category"],
             "layer": item["layer"],
@@ -99,18 +115,28 @@ def recommend(ctx, top_k=10):
             "structure": item["structure"]
         })
 
-    results.sort(key=lambda x: x["score"], reverse=True)
-    return results[:top_k]
+    return results
 
 
 if __name__ == "__main__":
+    PROC_DIR = os.path.join(BASE_DIR, "processed")
+
+    embeddings = np.load(os.path.join(PROC_DIR, "embeddings.npy"))
+    image_names = np.load(os.path.join(PROC_DIR, "image_names.npy"), allow_pickle=True)
+
+    with open(os.path.join(PROC_DIR, "metadata.json")) as f:
+        metadata = json.load(f)
+
     ctx = {
+        "gender": "women",
+        "category": "top",
+        "layer": "inner",
         "season": "summer",
         "style": "formal",
-        "occasion": "party"
+        "occasion": "formal"
     }
 
-    recs = recommend(ctx, top_k=5)
+    recs = recommend(ctx, metadata, embeddings, image_names, top_k=5)
 
     for r in recs:
-        print(r)
\ No newline at end of file
+        print(r)
@@ -0,0 +1,106 @@
+"""
+Server-side outfit sessions.
+
+An OutfitSession keeps the catalog id of every slot plus one
+float32 running sum of their embeddings. Slot vectors are read
+from the catalog's embedding array (shared, never copied), so a
+session costs a few hundred bytes plus one D-vector, and the
+reference vector for one slot (the mean of the other slots) and
+a slot swap both cost O(D) instead of re-resolving and
+re-averaging the whole outfit.
+
+Sessions live in a TTLStore: a bounded, thread-safe LRU map whose
+entries expire after `ttl` seconds without use. The store is
+per process, so a session id only works on the worker that
+created it.
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TTLStore:
+
+    def __init__(self, max_entries=10000, ttl=1800):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, value, key=None):
+        """Store value and return its key (a new random id by default)."""
+        key = key or uuid.uuid4().hex
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return key
+
+    def get(self, key):
+        """Value for key (refreshing its TTL), or None if missing/expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stamp, value = entry
+            now = time.monotonic()
+            if now - stamp > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            return value
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        return None if entry is None else entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class OutfitSession:
+
+    def __init__(self, outfit, embeddings, context, level="item"):
+        """
+        outfit:     {slot: item dict with "id"} as built by generate_outfit
+        embeddings: the catalog array the ids index (kept by reference)
+        context:    gender / season / occasion / style of the request
+        """
+        self.context = context
+        self.level = level
+        self.embeddings = embeddings
+        self.ids = {slot: int(item["id"]) for slot, item in outfit.items()}
+        self.lock = threading.Lock()
+        self._sum()
+
+    def _sum(self):
+        # re-summed from the catalog on every swap, so float32
+        # rounding does not build up over many replacements
+        rows = list(self.ids.values())
+        self.total = np.asarray(self.embeddings[rows], dtype=np.float32).sum(axis=0)
+
+    def reference_vector(self, slot):
+        """Mean embedding of every slot except `slot` (None if no others)."""
+        others = len(self.ids) - (slot in self.ids)
+        if others == 0:
+            return None
+        total = self.total
+        if slot in self.ids:
+            total = total - self.embeddings[self.ids[slot]]
+        return total / others
+
+    def replace(self, slot, index):
+        """Put catalog row `index` into `slot` (or add the slot)."""
+        self.ids[slot] = int(index)
+        self._sum()
+
+    def outfit(self, build_item):
+        """{slot: item dict}, built by build_item(index)."""
+        return {slot: build_item(index) for slot, index in self.ids.items()}
@@ -0,0 +1,453 @@
+"""
+Sharded catalog serving.
+
+build_shards() partitions processed/ into shard directories,
+either by (gender, slot) or by a hash of the image name. Each
+shard is served by its own worker process (serve_shard) that
+answers top-k queries over a local socket. ShardCoordinator
+scatters a query to the relevant shards, merges their top-k
+lists and rebuilds outfits with the same slot and item rules
+as generate_outfit / recommend_slot_alternatives.
+
+Usage:
+    python scripts/sharding.py build --scheme slot
+    python scripts/sharding.py build --scheme hash --shards 8
+    python scripts/sharding.py serve --shard processed/shards/men-TOP --port 7001
+"""
+
+import os
+import sys
+import json
+import heapq
+import zlib
+import argparse
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import Listener, Client
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.slots import get_slot
+from scripts.rules import item_allowed
+from scripts.catalog import normalize_rows, unit_vector, top_k_order
+from scripts.generate_outfit import active_slots
+
+PROC_DIR = os.path.join(BASE_DIR, "processed")
+SHARD_DIR = os.path.join(PROC_DIR, "shards")
+
+MAX_CACHED_POOLS = 256
+
+
+# -----------------------------
+# Build: partition processed/
+# -----------------------------
+
+def shard_name(item, scheme, n_shards):
+    if scheme == "slot":
+        return f"{item.get('gender')}-{get_slot(item)}"
+    return f"hash-{zlib.crc32(item['image'].encode()) % n_shards:03d}"
+
+
+def build_shards(proc_dir=PROC_DIR, out_dir=SHARD_DIR, scheme="slot", n_shards=4):
+    """
+    Write one directory per shard with its own embeddings.npy,
+    image_names.npy and metadata.json (items keep their global
+    "id"), plus a shards.json index used for routing.
+    """
+    embeddings = np.load(os.path.join(proc_dir, "embeddings.npy"))
+    image_names = np.load(os.path.join(proc_dir, "image_names.npy"), allow_pickle=True)
+
+    with open(os.path.join(proc_dir, "metadata.json")) as f:
+        metadata = json.load(f)
+
+    groups = {}
+    for i, item in enumerate(metadata):
+        groups.setdefault(shard_name(item, scheme, n_shards), []).append(i)
+
+    index = {"scheme": scheme, "shards": []}
+
+    for name, rows in sorted(groups.items()):
+        path = os.path.join(out_dir, name)
+        os.makedirs(path, exist_ok=True)
+
+        np.save(os.path.join(path, "embeddings.npy"), embeddings[rows])
+        np.save(os.path.join(path, "image_names.npy"), image_names[rows])
+        with open(os.path.join(path, "metadata.json"), "w") as f:
+            json.dump([metadata[i] for i in rows], f)
+
+        entry = {"name": name, "count": len(rows)}
+        if scheme == "slot":
+            entry["gender"] = metadata[rows[0]].get("gender")
+            entry["slot"] = get_slot(metadata[rows[0]])
+        index["shards"].append(entry)
+
+    with open(os.path.join(out_dir, "shards.json"), "w") as f:
+        json.dump(index, f, indent=2)
+
+    return index
+
+
+# -----------------------------
+# Worker: one shard per process
+# -----------------------------
+
+class ShardIndex:
+    """In-memory shard answering pool and top-k queries."""
+
+    def __init__(self, shard_dir):
+        self.embeddings = np.load(os.path.join(shard_dir, "embeddings.npy"))
+        self.image_names = np.load(os.path.join(shard_dir, "image_names.npy"), allow_pickle=True)
+
+        with open(os.path.join(shard_dir, "metadata.json")) as f:
+            self.metadata = json.load(f)
+
+        self.unit = normalize_rows(self.embeddings)
+        self.ids = np.array([item["id"] for item in self.metadata], dtype=np.int64)
+        self.rows_by_name = {str(name): r for r, name in enumerate(self.image_names)}
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+
+    def pool(self, gender, slot, season, occasion, canonical_only=False):
+        """Shard rows passing the gender, slot and item rules."""
+        key = (gender, slot, season, occasion, canonical_only)
+        rows = self._pools.get(key)
+        if rows is None:
+            rows = np.array([
+                r for r, item in enumerate(self.metadata)
+                if item.get("gender") == gender
+                and get_slot(item) == slot
+                and item_allowed(item, slot, season, occasion)
+                and (not canonical_only or item.get("canonical_id", item["id"]) == item["id"])
+            ], dtype=np.int64)
+            with self._pools_lock:
+                if len(self._pools) >= MAX_CACHED_POOLS:
+                    self._pools.pop(next(iter(self._pools)))
+                self._pools[key] = rows
+        return rows
+
+    def summary(self, r):
+        item = self.metadata[r]
+        return {
+            "id": item["id"],
+            "image": str(self.image_names[r]),
+            "category": item.get("category"),
+            "gender": item.get("gender")
+        }
+
+    def handle(self, msg):
+        op = msg["op"]
+
+        if op == "ping":
+            return "pong"
+
+        if op == "pool_stats":
+            rows = self.pool(**msg["filters"])
+            return {"count": len(rows), "sum": self.embeddings[rows].sum(axis=0)}
+
+        if op == "top_k":
+            rows = self.pool(**msg["filters"])
+            exclude = msg.get("exclude_ids")
+            if exclude and len(rows):
+                rows = rows[~np.isin(self.ids[rows], exclude)]
+            if not len(rows):
+                return {"count": 0, "hits": []}
+
+            scores = self.unit[rows] @ unit_vector(msg["ref"])
+            hits = []
+            for pos in top_k_order(scores, msg["k"]):
+                hit = (float(scores[pos]), self.summary(rows[pos]))
+                if msg.get("with_embedding"):
+                    hit += (self.embeddings[rows[pos]],)
+                hits.append(hit)
+            return {"count": len(rows), "hits": hits}
+
+        if op == "lookup":
+            found = {}
+            for name in msg["images"]:
+                r = self.rows_by_name.get(name)
+                if r is not None:
+                    item = self.metadata[r]
+                    found[name] = {
+                        "id": item["id"],
+                        "canonical_id": item.get("canonical_id", item["id"]),
+                        "embedding": self.embeddings[r]
+                    }
+            return found
+
+        raise ValueError(f"Unknown op: {op}")
+
+
+def serve_shard(shard_dir, address=("127.0.0.1", 0), authkey=None, ready=None):
+    """
+    Serve one shard until the process is terminated. Each client
+    connection gets its own thread. If `ready` (a Pipe end) is
+    given, the bound address is sent through it.
+    """
+    index = ShardIndex(shard_dir)
+    listener = Listener(address, authkey=authkey)
+
+    if ready is not None:
+        ready.send(listener.address)
+        ready.close()
+
+    def handle_connection(conn):
+        with conn:
+            while True:
+                try:
+                    msg = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    conn.send(("ok", index.handle(msg)))
+                except Exception as e:
+                    conn.send(("error", str(e)))
+
+    while True:
+        conn = listener.accept()
+        threading.Thread(target=handle_connection, args=(conn,), daemon=True).start()
+
+
+def start_local_shards(shard_root=SHARD_DIR, authkey=None):
+    """
+    Spawn one worker process per shard on this machine.
+    Returns (shard index, processes, addresses). If a worker exits
+    before it starts serving, the workers already started are
+    stopped and RuntimeError names the shard.
+    """
+    with open(os.path.join(shard_root, "shards.json")) as f:
+        index = json.load(f)
+
+    processes, addresses = [], []
+    for shard in index["shards"]:
+        parent_end, child_end = mp.Pipe(duplex=False)
+        process = mp.Process(
+            target=serve_shard,
+            args=(os.path.join(shard_root, shard["name"]), ("127.0.0.1", 0), authkey, child_end),
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+        # only the child may hold the write end, so recv() sees EOF
+        # instead of blocking forever if the child dies
+        child_end.close()
+
+        try:
+            addresses.append(parent_end.recv())
+        except EOFError:
+            process.join()
+            for started in processes:
+                started.terminate()
+            raise RuntimeError(
+                f"Shard {shard['name']} exited with code {process.exitcode} "
+                "before it started serving; see its traceback above"
+            ) from None
+        finally:
+            parent_end.close()
+
+    return index, processes, addresses
+
+
+# -----------------------------
+# Coordinator: scatter / gather
+# -----------------------------
+
+class ShardCoordinator:
+    """
+    Fans queries out to shard workers and merges their answers.
+    Keeps a small pool of connections per shard so concurrent
+    API requests do not serialize on one socket.
+    """
+
+    def __init__(self, index, addresses, authkey=None, connections_per_shard=4):
+        self.index = index
+        self.addresses = addresses
+        self.authkey = authkey
+        self._idle = [[] for _ in addresses]
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(addresses) * connections_per_shard)
+        )
+
+    # ---------- transport ----------
+
+    def _call(self, shard, msg):
+        with self._lock:
+            conn = self._idle[shard].pop() if self._idle[shard] else None
+        if conn is None:
+            conn = Client(self.addresses[shard], authkey=self.authkey)
+
+        try:
+            conn.send(msg)
+            status, result = conn.recv()
+        except Exception:
+            conn.close()
+            raise
+
+        with self._lock:
+            self._idle[shard].append(conn)
+
+        if status != "ok":
+            raise RuntimeError(f"Shard {shard} failed: {result}")
+        return result
+
+    def scatter(self, msg, shards):
+        return list(self._executor.map(lambda s: self._call(s, msg), shards))
+
+    def shards_for(self, gender=None, slot=None):
+        """With (gender, slot) sharding only matching shards are queried."""
+        if self.index["scheme"] != "slot":
+            return range(len(self.addresses))
+        return [
+            s for s, shard in enumerate(self.index["shards"])
+            if (gender is None or shard["gender"] == gender)
+            and (slot is None or shard["slot"] == slot)
+        ]
+
+    # ---------- queries ----------
+
+    @staticmethod
+    def record_pool_size(stats, slot, count):
+        if stats is not None:
+            stats.setdefault("pool_sizes", {})[slot] = count
+
+    def top_k(self, filters, ref, k, exclude_ids=None, with_embedding=False, stats=None):
+        """
+        Merged (score, item[, embedding]) hits, best first. If `stats`
+        is a dict it receives the pool size summed over the shards.
+        """
+        msg = {
+            "op": "top_k", "filters": filters, "ref": ref, "k": k,
+            "exclude_ids": exclude_ids, "with_embedding": with_embedding
+        }
+        partials = self.scatter(msg, self.shards_for(filters["gender"], filters["slot"]))
+        self.record_pool_size(stats, filters["slot"], sum(p["count"] for p in partials))
+        return heapq.nlargest(
+            k, (hit for part in partials for hit in part["hits"]), key=lambda hit: hit[0]
+        )
+
+    def pool_centroid(self, filters, stats=None):
+        partials = self.scatter(
+            {"op": "pool_stats", "filters": filters},
+            self.shards_for(filters["gender"], filters["slot"])
+        )
+        count = sum(p["count"] for p in partials)
+        self.record_pool_size(stats, filters["slot"], count)
+        if not count:
+            return None
+        return sum(p["sum"] for p in partials) / count
+
+    def lookup(self, images, gender=None):
+        found = {}
+        for part in self.scatter({"op": "lookup", "images": images}, self.shards_for(gender)):
+            found.update(part)
+        return found
+
+    # ---------- outfit logic ----------
+
+    def generate_outfit(
+        self, gender, season, occasion, style=None, canonical_only=False, stats=None
+    ):
+        """Sharded equivalent of scripts.generate_outfit.generate_outfit."""
+        def filters(slot):
+            return {
+                "gender": gender, "slot": slot, "season": season,
+                "occasion": occasion, "canonical_only": canonical_only
+            }
+
+        # TOP anchor: closest to the centroid of the whole TOP pool
+        centroid = self.pool_centroid(filters("TOP"), stats)
+        if centroid is None:
+            return None
+
+        _, anchor, anchor_vector = self.top_k(filters("TOP"), centroid, 1, with_embedding=True)[0]
+        outfit = {"TOP": anchor}
+
+        reference_vectors = [anchor_vector]
+
+        for slot in active_slots(season):
+            if slot == "TOP":
+                continue
+
+            hits = self.top_k(
+                filters(slot), np.mean(reference_vectors, axis=0), 1,
+                with_embedding=True, stats=stats
+            )
+            if not hits:
+                continue
+
+            _, best, best_vector = hits[0]
+            outfit[slot] = best
+            reference_vectors.append(best_vector)
+
+        return outfit
+
+    def slot_alternatives(
+        self, current_outfit, slot, gender, season, occasion, top_k=5,
+        canonical_only=False, stats=None
+    ):
+        """Sharded equivalent of recommend_slot_alternatives."""
+        found = self.lookup([item["image"] for item in current_outfit.values()], gender)
+
+        ref_vectors = [
+            found[item["image"]]["embedding"]
+            for s, item in current_outfit.items()
+            if s != slot and item["image"] in found
+        ]
+        if not ref_vectors:
+            return []
+
+        current = found.get(current_outfit[slot]["image"])
+        exclude = []
+        if current is not None:
+            exclude.append(current["id"])
+            if canonical_only:
+                exclude.append(current["canonical_id"])
+
+        hits = self.top_k(
+            {
+                "gender": gender, "slot": slot, "season": season,
+                "occasion": occasion, "canonical_only": canonical_only
+            },
+            np.mean(ref_vectors, axis=0),
+            top_k,
+            exclude_ids=exclude,
+            stats=stats
+        )
+        return [{**item, "score": score} for score, item, *_ in hits]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            for conns in self._idle:
+                for conn in conns:
+                    conn.close()
+                conns.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or serve catalog shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build")
+    build.add_argument("--scheme", choices=["slot", "hash"], default="slot")
+    build.add_argument("--shards", type=int, default=4, help="shard count for --scheme hash")
+    build.add_argument("--out", default=SHARD_DIR)
+
+    serve = sub.add_parser("serve")
+    serve.add_argument("--shard", required=True)
+    serve.add_argument("--port", type=int, required=True)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = build_shards(out_dir=args.out, scheme=args.scheme, n_shards=args.shards)
+        for shard in index["shards"]:
+            print(f"{shard['name']:>20}: {shard['count']} items")
+        print("✅ Shards written to", args.out)
+    else:
+        authkey = os.environ.get("FRSCA_SHARD_AUTHKEY", "").encode() or None
+        serve_shard(args.shard, ("127.0.0.1", args.port), authkey)
@@ -0,0 +1,129 @@
+"""
+Low-dimensional signatures for two-stage retrieval.
+
+Run after build_metadata.py (and dedup.py). Every catalog row gets
+a 64-d signature: its unit embedding, centred on the catalog mean
+and projected onto the top principal components (or a random
+Gaussian projection with --method random). For a query vector q,
+signature · (projection.T q) approximates q · (x - mean), which
+ranks candidates the same way as cosine similarity to q.
+
+Serving ranks the whole candidate pool on signatures (stage 1),
+then re-scores only the best `shortlist` rows with the full
+embeddings (stage 2). See catalog.score_rows.
+
+Writes processed/signatures.npz (and product_signatures.npz for
+the product table), each recording the fingerprint of the catalog
+it was built from (scripts/validate_catalog.py). The API ignores
+signatures whose fingerprint or row count no longer matches, so
+re-run this after rebuilding the catalog.
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from scripts.catalog import normalize_rows
+from scripts.validate_catalog import catalog_fingerprint, read_fingerprint
+
+PROC_DIR = os.path.join(BASE_DIR, "processed")
+
+SIGNATURE_DIM = 64
+PCA_SAMPLE = 20000
+
+# level: (embeddings, signatures)
+CATALOG_FILES = {
+    "item": ("embeddings.npy", "signatures.npz"),
+    "product": ("product_embeddings.npy", "product_signatures.npz")
+}
+
+
+class SignatureIndex:
+
+    def __init__(self, vectors, projection, fingerprint=None):
+        """
+        vectors:     (N, d) float32 signatures, one per catalog row
+        projection:  (D, d) float32 projection matrix
+        fingerprint: catalog fingerprint the signatures were built from
+        """
+        self.vectors = vectors
+        self.projection = projection
+        self.fingerprint = fingerprint
+
+    def query(self, vector):
+        """Project a (unit) query into signature space."""
+        return np.asarray(vector, dtype=np.float32) @ self.projection
+
+    def save(self, path):
+        arrays = {"vectors": self.vectors, "projection": self.projection}
+        if self.fingerprint is not None:
+            arrays["fingerprint"] = np.array(self.fingerprint)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["vectors"], data["projection"], read_fingerprint(data))
+
+
+def fit_projection(centred, dim=SIGNATURE_DIM, method="pca", seed=0):
+    """(D, dim) projection: top principal components or random Gaussian."""
+    rng = np.random.default_rng(seed)
+
+    if method == "random":
+        projection = rng.normal(size=(centred.shape[1], dim)) / np.sqrt(dim)
+        return projection.astype(np.float32)
+
+    if len(centred) > PCA_SAMPLE:
+        centred = centred[rng.choice(len(centred), PCA_SAMPLE, replace=False)]
+    _, _, components = np.linalg.svd(centred, full_matrices=False)
+    return components[:dim].T.astype(np.float32)
+
+
+def build_signatures(embeddings, dim=SIGNATURE_DIM, method="pca", seed=0):
+    # centring drops the component every item shares (ResNet features
+    # are non-negative), which a query's ranking does not depend on
+    centred = normalize_rows(embeddings)
+    centred -= centred.mean(axis=0)
+
+    dim = min(dim, centred.shape[1])
+    projection = fit_projection(centred, dim, method, seed)
+    return SignatureIndex(centred @ projection, projection)
+
+
+def load_signatures(filename, proc_dir=PROC_DIR):
+    """SignatureIndex for a catalog, or None if it was not built."""
+    path = os.path.join(proc_dir, filename)
+    if not os.path.exists(path):
+        return None
+    return SignatureIndex.load(path)
+
+
+def write_signatures(proc_dir=PROC_DIR, dim=SIGNATURE_DIM, method="pca", seed=0):
+    """Build and save signatures for every catalog level in proc_dir."""
+    written = {}
+    for level, (embeddings_file, out_file) in CATALOG_FILES.items():
+        path = os.path.join(proc_dir, embeddings_file)
+        if not os.path.exists(path):
+            continue
+
+        index = build_signatures(np.load(path), dim, method, seed)
+        index.fingerprint = catalog_fingerprint(proc_dir, level)
+        index.save(os.path.join(proc_dir, out_file))
+        written[out_file] = index
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build two-stage retrieval signatures")
+    parser.add_argument("--dim", type=int, default=SIGNATURE_DIM)
+    parser.add_argument("--method", choices=["pca", "random"], default="pca")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for out_file, index in write_signatures(PROC_DIR, args.dim, args.method, args.seed).items():
+        print(f"✅ {out_file}: {index.vectors.shape[0]} rows x {index.vectors.shape[1]} dims ({args.method})")
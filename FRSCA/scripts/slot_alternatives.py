@@ -1,11 +1,11 @@
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from scripts.slots import get_slot
 from scripts.rules import item_allowed
+from scripts.catalog import top_k_order, score_rows
 
 
-def recommend_slot_alternatives(
+def score_slot_candidates(
     current_outfit,
     slot,
     metadata,
@@ -14,36 +14,65 @@ def recommend_slot_alternatives(
     gender,
     season,
     occasion,
-    top_k=5
+    canonical_only=False,
+    stats=None,
+    ref_vector=None,
+    image_index=None,
+    unit_embeddings=None,
+    signatures=None,
+    shortlist=0
 ):
     """
-    Return top-K compatible items for ONE slot,
-    without mutating the outfit.
+    Every allowed candidate for ONE slot and its compatibility
+    score, unsorted: (candidate rows, scores).
+
+    If `stats` is a dict it receives the candidate pool size
+    (used by the request profiler). `ref_vector` skips rebuilding
+    the reference from the other slots (outfit sessions keep it
+    up to date); `image_index` maps image name → row to avoid
+    scanning image_names. With signatures and a shortlist only
+    the shortlisted candidates are returned (two-stage retrieval,
+    see catalog.score_rows).
     """
+    empty = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    def resolve(image):
+        if image_index is not None:
+            return image_index[image]
+        return list(image_names).index(image)
 
     # -----------------------------
     # 1. Build reference vector from other slots
     # -----------------------------
-    ref_vectors = []
-    for s, item in current_outfit.items():
-        if s == slot:
-            continue
-        idx = list(image_names).index(item["image"])
-        ref_vectors.append(embeddings[idx])
+    if ref_vector is None:
+        ref_vectors = []
+        for s, item in current_outfit.items():
+            if s == slot:
+                continue
+            ref_vectors.append(embeddings[resolve(item["image"])])
 
-    if not ref_vectors:
-        return []
+        if not ref_vectors:
+            return empty
 
-    ref_vector = np.mean(ref_vectors, axis=0)
+        ref_vector = np.mean(ref_vectors, axis=0)
 
     # -----------------------------
     # 2. Collect candidates for the slot
     # -----------------------------
+    current_idx = resolve(current_outfit[slot]["image"])
+    current_canonical = metadata[current_idx].get("canonical_id", current_idx)
+
     candidates = []
     for i, item in enumerate(metadata):
         if item.get("gender") != gender:
             continue
 
+        # representatives only, and never a duplicate of the current item
+        if canonical_only:
+            canonical = item.get("canonical_id", i)
+            if canonical != i or canonical == current_canonical:
+                continue
+
         if get_slot(item) != slot:
             continue
 
@@ -56,31 +85,102 @@ def recommend_slot_alternatives(
 
         candidates.append(i)
 
+    if stats is not None:
+        stats["pool_sizes"] = {slot: len(candidates)}
+
     if not candidates:
-        return []
+        return empty
 
     # -----------------------------
     # 3. Score by compatibility
     # -----------------------------
-    scored = []
-    for i in candidates:
-        sim = cosine_similarity(
-            [ref_vector], [embeddings[i]]
-        )[0][0]
-        scored.append((i, sim))
+    return score_rows(
+        ref_vector, candidates, embeddings,
+        unit_embeddings, signatures, shortlist
+    )
+
+
+def alternative_item(i, score, metadata, image_names):
+    return {
+        "id": int(i),
+        "image": str(image_names[i]),
+        "category": metadata[i].get("category"),
+        "gender": metadata[i].get("gender"),
+        "score": float(score)
+    }
 
-    scored.sort(key=lambda x: x[1], reverse=True)
+
+def recommend_slot_alternatives(
+    current_outfit,
+    slot,
+    metadata,
+    embeddings,
+    image_names,
+    gender,
+    season,
+    occasion,
+    top_k=5,
+    **kwargs
+):
+    """
+    Return top-K compatible items for ONE slot,
+    without mutating the outfit.
+
+    Keyword arguments (canonical_only, stats, ref_vector,
+    image_index, unit_embeddings, signatures, shortlist) are
+    passed to score_slot_candidates. A shortlist never returns
+    fewer than top_k alternatives.
+    """
+    if kwargs.get("shortlist"):
+        kwargs["shortlist"] = max(kwargs["shortlist"], top_k)
+
+    candidates, scores = score_slot_candidates(
+        current_outfit, slot, metadata, embeddings, image_names,
+        gender, season, occasion, **kwargs
+    )
 
     # -----------------------------
     # 4. Return top-K alternatives
     # -----------------------------
-    results = []
-    for i, score in scored[:top_k]:
-        results.append({
-            "image": image_names[i],
-            "category": metadata[i].get("category"),
-            "gender": metadata[i].get("gender"),
-            "score": float(score)
-        })
-
-    return results
\ No newline at end of file
+    return [
+        alternative_item(candidates[p], scores[p], metadata, image_names)
+        for p in top_k_order(scores, top_k)
+    ]
+
+
+def replace_slot(
+    current_outfit,
+    slot_to_replace,
+    metadata,
+    embeddings,
+    image_names,
+    gender,
+    season,
+    occasion,
+    style=None,
+    **kwargs
+):
+    """
+    Return a copy of the outfit with ONE slot swapped for its
+    best-scoring alternative (unchanged if there is none).
+    """
+    alternatives = recommend_slot_alternatives(
+        current_outfit=current_outfit,
+        slot=slot_to_replace,
+        metadata=metadata,
+        embeddings=embeddings,
+        image_names=image_names,
+        gender=gender,
+        season=season,
+        occasion=occasion,
+        top_k=1,
+        **kwargs
+    )
+
+    new_outfit = dict(current_outfit)
+    if alternatives:
+        best = dict(alternatives[0])
+        best.pop("score")
+        new_outfit[slot_to_replace] = best
+
+    return new_outfit
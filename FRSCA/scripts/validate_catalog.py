@@ -0,0 +1,329 @@
+"""
+Catalog integrity check and fingerprint.
+
+Checks that embeddings.npy rows, image_names.npy and the
+metadata.json ids/images line up, that no embedding is NaN/inf
+or all-zero, that no image name is duplicated and that every
+image file exists.
+
+Embeddings are scanned in fixed-size row blocks with one reduction
+per block, so a million-row catalog is checked in seconds. The
+same pass produces a catalog fingerprint (blake2b over the names,
+the metadata bytes and a CRC of every embedding block) that changes
+whenever any of them does; caches and clients can use it as a
+version.
+
+Files built from a catalog (two-stage retrieval signatures, learned
+compatibility vectors) record the fingerprint they were built from; a stale one is reported with
+a warning, and the API stops using it.
+
+Runs at the end of build_metadata.py / dedup.py and at API
+startup. Standalone:
+    python scripts/validate_catalog.py [--no-files]
+"""
+
+import os
+import sys
+import json
+import zlib
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROC_DIR = os.path.join(BASE_DIR, "processed")
+IMG_DIR = os.path.join(BASE_DIR, "train_images")
+
+BLOCK_ROWS = 65536
+STAT_CHUNK = 4096
+MAX_EXAMPLES = 5
+
+
+def _examples(values):
+    values = [str(v) for v in values[:MAX_EXAMPLES]]
+    return ", ".join(values)
+
+
+def check_embeddings(embeddings, hasher):
+    """Row-blocked NaN / zero scan that also feeds the fingerprint."""
+    problems = []
+    bad_rows, zero_rows = [], []
+
+    for start in range(0, len(embeddings), BLOCK_ROWS):
+        block = np.ascontiguousarray(embeddings[start:start + BLOCK_ROWS])
+        hasher.update(zlib.crc32(block).to_bytes(4, "little"))
+
+        # one pass: NaN/inf propagate into the squared norm, zero rows give 0
+        squared = np.einsum("ij,ij->i", block, block)
+        suspect = np.flatnonzero(~(squared > 0) | ~np.isfinite(squared))
+        if len(suspect) == 0:
+            continue
+
+        rows = block[suspect]
+        finite = np.isfinite(rows).all(axis=1)
+        bad_rows.extend(suspect[~finite] + start)
+        zero_rows.extend(suspect[finite & ~rows.any(axis=1)] + start)
+
+    if bad_rows:
+        problems.append(f"{len(bad_rows)} embeddings contain NaN/inf (rows {_examples(bad_rows)})")
+    if zero_rows:
+        problems.append(f"{len(zero_rows)} embeddings are all zero (rows {_examples(zero_rows)})")
+
+    return problems
+
+
+def check_files(image_dir, names, workers=32):
+    """
+    Names whose image file is missing. One directory listing covers
+    the flat image folder; anything not in it (sub-paths, symlinked
+    or late files) is checked with parallel stat calls.
+    """
+    try:
+        listed = set(os.listdir(image_dir))
+    except OSError:
+        listed = set()
+    unlisted = [name for name in names if name not in listed]
+
+    def stat_chunk(chunk):
+        return [name for name in chunk if not os.path.isfile(os.path.join(image_dir, name))]
+
+    chunks = [unlisted[i:i + STAT_CHUNK] for i in range(0, len(unlisted), STAT_CHUNK)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [name for missing in pool.map(stat_chunk, chunks) for name in missing]
+
+
+def validate_catalog(
+    proc_dir=PROC_DIR,
+    image_dir=IMG_DIR,
+    embeddings=None,
+    image_names=None,
+    metadata=None,
+    check_images=True,
+    metadata_file="metadata.json",
+    embeddings_file="embeddings.npy",
+    names_file="image_names.npy",
+    global_ids=False
+):
+    """
+    Validate one catalog (item level by default; pass the product
+    file names for products.json). Arrays already in memory can be
+    passed in; anything missing is loaded from proc_dir (embeddings
+    memory-mapped). With global_ids (shards) metadata ids must be
+    unique instead of equal to their row.
+
+    Returns {"fingerprint", "items", "dim", "problems": [...]}.
+    """
+    if embeddings is None:
+        embeddings = np.load(os.path.join(proc_dir, embeddings_file), mmap_mode="r")
+    if image_names is None:
+        image_names = np.load(os.path.join(proc_dir, names_file), allow_pickle=True)
+
+    with open(os.path.join(proc_dir, metadata_file), "rb") as f:
+        meta_bytes = f.read()
+    if metadata is None:
+        metadata = json.loads(meta_bytes)
+
+    hasher = hashlib.blake2b(digest_size=16)
+    problems = []
+
+    # -----------------------------
+    # Shapes
+    # -----------------------------
+    if embeddings.ndim != 2:
+        problems.append(f"embeddings.npy has shape {embeddings.shape}, expected (N, D)")
+        return {"fingerprint": None, "items": len(metadata), "dim": None, "problems": problems}
+
+    n = len(embeddings)
+    if len(image_names) != n or len(metadata) != n:
+        problems.append(
+            f"row counts differ: embeddings {n}, image_names {len(image_names)}, "
+            f"metadata {len(metadata)}"
+        )
+
+    hasher.update(repr((embeddings.shape, str(embeddings.dtype))).encode())
+
+    # -----------------------------
+    # Ordering: metadata[i] describes row i
+    # -----------------------------
+    names = np.array([str(name) for name in image_names], dtype=object)
+    m = min(n, len(names), len(metadata))
+
+    ids = np.array([item.get("id", -1) for item in metadata[:m]])
+    if global_ids:
+        unique_ids, id_counts = np.unique(ids, return_counts=True)
+        duplicated_ids = unique_ids[(id_counts > 1) | (unique_ids < 0)]
+        if len(duplicated_ids):
+            problems.append(
+                f"{len(duplicated_ids)} metadata ids are missing or duplicated "
+                f"({_examples(duplicated_ids)})"
+            )
+    else:
+        wrong_ids = np.flatnonzero(ids != np.arange(m))
+        if len(wrong_ids):
+            problems.append(f"{len(wrong_ids)} metadata ids do not match their row (rows {_examples(wrong_ids)})")
+
+    meta_images = np.array([item.get("image") for item in metadata[:m]], dtype=object)
+    wrong_images = np.flatnonzero(meta_images != names[:m])
+    if len(wrong_images):
+        problems.append(
+            f"{len(wrong_images)} metadata images differ from {names_file} "
+            f"(rows {_examples(wrong_images)})"
+        )
+
+    unique, counts = np.unique(names.astype(str), return_counts=True)
+    duplicated = unique[counts > 1]
+    if len(duplicated):
+        problems.append(f"{len(duplicated)} image names are duplicated ({_examples(duplicated)})")
+
+    hasher.update("\n".join(names).encode())
+    hasher.update(meta_bytes)
+
+    # -----------------------------
+    # Vectors
+    # -----------------------------
+    problems += check_embeddings(embeddings, hasher)
+
+    # -----------------------------
+    # Image files
+    # -----------------------------
+    if check_images:
+        missing = check_files(image_dir, list(names))
+        if missing:
+            problems.append(f"{len(missing)} image files are missing ({_examples(missing)})")
+
+    return {
+        "fingerprint": hasher.hexdigest(),
+        "items": n,
+        "dim": int(embeddings.shape[1]),
+        "problems": problems
+    }
+
+
+PRODUCT_FILES = {
+    "metadata_file": "products.json",
+    "embeddings_file": "product_embeddings.npy",
+    "names_file": "product_image_names.npy"
+}
+
+
+def validate_all(proc_dir=PROC_DIR, image_dir=IMG_DIR, check_images=True):
+    """Reports for the item catalog and, when built, the product catalog."""
+    reports = {"item": validate_catalog(proc_dir, image_dir, check_images=check_images)}
+    if os.path.exists(os.path.join(proc_dir, PRODUCT_FILES["metadata_file"])):
+        reports["product"] = validate_catalog(
+            proc_dir, image_dir, check_images=check_images, **PRODUCT_FILES
+        )
+    return reports
+
+
+# Files built from one catalog level: npz archives with "vectors"
+# (one row per catalog row) and the "fingerprint" of that catalog
+DERIVED_FILES = {
+    "item": {
+        "signatures.npz": "scripts/signatures.py",
+        "compat_embeddings.npz": "scripts/compat_projection.py"
+    },
+    "product": {
+        "product_signatures.npz": "scripts/signatures.py",
+        "product_compat_embeddings.npz": "scripts/compat_projection.py"
+    }
+}
+
+
+def stale_reason(filename, built_from, rows, fingerprint, catalog_rows):
+    """
+    Why a derived file does not match its catalog, or None if it
+    does. With no catalog fingerprint (validation skipped) only the
+    row count is compared.
+    """
+    if rows != catalog_rows:
+        return f"{filename} has {rows} rows but the catalog has {catalog_rows}"
+    if fingerprint is not None and built_from != fingerprint:
+        return f"{filename} was built from another version of the catalog"
+    return None
+
+
+def read_fingerprint(data):
+    """Fingerprint stored in a loaded derived npz (None if absent)."""
+    return str(data["fingerprint"]) if "fingerprint" in data.files else None
+
+
+def check_derived(reports, proc_dir=PROC_DIR):
+    """Warnings for derived files that no longer match their catalog."""
+    warnings = []
+    for level, report in reports.items():
+        for filename, script in DERIVED_FILES[level].items():
+            path = os.path.join(proc_dir, filename)
+            if not os.path.exists(path):
+                continue
+            with np.load(path) as data:
+                reason = stale_reason(
+                    filename, read_fingerprint(data), len(data["vectors"]),
+                    report["fingerprint"], report["items"]
+                )
+            if reason:
+                warnings.append(f"{reason}; re-run {script}")
+    return warnings
+
+
+def validate_shards(shard_root, image_dir=IMG_DIR, check_images=True):
+    """Reports for every shard written by scripts/sharding.py."""
+    with open(os.path.join(shard_root, "shards.json")) as f:
+        index = json.load(f)
+    return {
+        shard["name"]: validate_catalog(
+            os.path.join(shard_root, shard["name"]), image_dir,
+            check_images=check_images, global_ids=True
+        )
+        for shard in index["shards"]
+    }
+
+
+def write_fingerprint(reports, proc_dir=PROC_DIR):
+    """processed/catalog_fingerprint.json: {level: {fingerprint, items, dim}}"""
+    summary = {
+        level: {k: report[k] for k in ("fingerprint", "items", "dim")}
+        for level, report in reports.items()
+    }
+    with open(os.path.join(proc_dir, "catalog_fingerprint.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+
+def print_report(report, level="item"):
+    if report["problems"]:
+        print(f"❌ {level} catalog validation failed:")
+        for problem in report["problems"]:
+            print("  -", problem)
+    else:
+        print(f"✅ {level} catalog valid: {report['items']} items x {report['dim']} dims, "
+              f"fingerprint {report['fingerprint']}")
+
+
+def catalog_fingerprint(proc_dir=PROC_DIR, level="item"):
+    """Current fingerprint of one catalog (image files not checked)."""
+    files = PRODUCT_FILES if level == "product" else {}
+    return validate_catalog(proc_dir, check_images=False, **files)["fingerprint"]
+
+
+def run(check_images=True):
+    """Validate, print, and write the fingerprint; exits 1 on problems."""
+    reports = validate_all(check_images=check_images)
+    for level, report in reports.items():
+        print_report(report, level)
+
+    if any(report["problems"] for report in reports.values()):
+        sys.exit(1)
+    write_fingerprint(reports)
+
+    for warning in check_derived(reports):
+        print("⚠️ ", warning)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate processed/ and print its fingerprint")
+    parser.add_argument("--no-files", action="store_true", help="skip the image file check")
+    args = parser.parse_args()
+
+    run(check_images=not args.no_files)
@@ -0,0 +1,100 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.compat_projection import (
+    info_nce, rule_codes, rule_mask, compat_rejection, MIN_EVAL_PAIRS
+)
+
+
+def batch(seed=0, n=12, dim=10, out=4):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.normal(size=(n, dim)),
+        rng.normal(size=(n, dim)),
+        rng.normal(size=(dim, out))
+    )
+
+
+@pytest.mark.parametrize("masked", [False, True])
+def test_info_nce_gradient_matches_finite_differences(masked):
+    xa, xb, weights = batch()
+    mask = None
+    if masked:
+        mask = np.random.default_rng(1).random((len(xa), len(xb))) < 0.3
+        np.fill_diagonal(mask, False)
+
+    _, grad = info_nce(xa, xb, weights, 0.5, mask)
+
+    eps = 1e-6
+    numeric = np.zeros_like(weights)
+    for index in np.ndindex(weights.shape):
+        step = np.zeros_like(weights)
+        step[index] = eps
+        numeric[index] = (
+            info_nce(xa, xb, weights + step, 0.5, mask)[0]
+            - info_nce(xa, xb, weights - step, 0.5, mask)[0]
+        ) / (2 * eps)
+
+    assert np.allclose(grad, numeric, rtol=1e-4, atol=1e-7)
+
+
+def test_masked_pairs_leave_the_softmax():
+    xa, xb, weights = batch()
+    xb[1] = xa[0]   # a near-duplicate partner, off the diagonal
+    mask = np.zeros((len(xa), len(xb)), dtype=bool)
+    mask[0, 1] = True
+
+    masked, _ = info_nce(xa, xb, weights, 0.5, mask)
+    unmasked, _ = info_nce(xa, xb, weights, 0.5)
+    assert masked < unmasked
+    assert np.isfinite(masked)
+
+
+def test_rule_mask_marks_compatible_pairs_off_the_diagonal():
+    metadata = [
+        {"gender": "men", "category": "top", "usage": ["casual"]},
+        {"gender": "men", "category": "top", "usage": ["formal"]},
+        {"gender": "men", "category": "bottom", "usage": ["casual", "formal"]},
+        {"gender": "women", "category": "bottom", "usage": ["casual"]},
+        {"gender": "men", "category": "bottom", "usage": ["cold"]},
+    ]
+    codes = rule_codes(metadata)
+
+    a = np.array([0, 1])
+    b = np.array([2, 2])
+    # the diagonal holds the labelled pairs; off it, item 2 shares
+    # "casual" with item 0 and "formal" with item 1 across slots
+    assert rule_mask(a, b, codes).tolist() == [[False, True], [True, False]]
+
+    a = np.array([0, 0, 1])
+    b = np.array([3, 4, 0])
+    # other gender, no shared tag, same slot: all real negatives
+    assert not rule_mask(a, b, codes).any()
+
+
+def report(pairs, raw, learned):
+    return {
+        "held_out_cooccurring_pairs": pairs,
+        "cooccurrence_recall@10_raw": raw,
+        "cooccurrence_recall@10_learned": learned
+    }
+
+
+@pytest.mark.parametrize("training_report", [
+    None,
+    report(0, float("nan"), float("nan")),
+    report(MIN_EVAL_PAIRS - 1, 0.1, 0.9),
+    report(MIN_EVAL_PAIRS, 0.3, 0.3),
+    report(MIN_EVAL_PAIRS, 0.08, 0.06),
+])
+def test_compat_rejected_unless_it_beats_raw(training_report):
+    assert compat_rejection(training_report)
+
+
+def test_compat_accepted_when_it_beats_raw():
+    assert compat_rejection(report(MIN_EVAL_PAIRS, 0.3, 0.35)) is None
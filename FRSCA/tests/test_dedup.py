@@ -0,0 +1,54 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.catalog import normalize_rows
+from scripts.dedup import find_duplicate_pairs, cluster_duplicates
+
+
+def near_duplicates(n=203, dim=32, seed=0):
+    """Unit rows where every fourth row is a noisy copy of an earlier one."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    for i in range(3, n, 4):
+        source = rng.integers(0, i)
+        vectors[i] = vectors[source] + 0.05 * rng.standard_normal(dim)
+    return normalize_rows(vectors)
+
+
+def test_blocked_pairs_match_brute_force():
+    unit = near_duplicates()
+    sims = unit @ unit.T
+    expected = set(zip(*np.nonzero(np.triu(sims > 0.95, k=1))))
+    assert len(expected) > 10
+
+    # 203 is not a multiple of any of these, so edge tiles are ragged
+    for block_size in (16, 50, 64, 1000):
+        rows, cols = find_duplicate_pairs(unit, 0.95, block_size)
+        pairs = list(zip(rows, cols))
+        assert len(pairs) == len(set(pairs))
+        assert set(pairs) == expected
+
+
+def test_no_pairs():
+    unit = np.eye(5, dtype=np.float32)
+    rows, cols = find_duplicate_pairs(unit, 0.95, 2)
+    assert len(rows) == len(cols) == 0
+
+
+def test_canonical_is_cluster_medoid():
+    # a chain at -0.2, 0, +0.2 rad: the middle member (index 2) is closest
+    # to the other two, even though the ends are not pairwise duplicates
+    angles = {0: -0.2, 2: 0.0, 4: 0.2}
+    unit = np.zeros((6, 3), dtype=np.float32)
+    for i, a in angles.items():
+        unit[i] = [np.cos(a), np.sin(a), 0.0]
+    unit[1] = [0.0, 0.0, 1.0]
+    unit[3] = [0.0, 1.0, 0.0]
+    unit[5] = [0.0, -1.0, 0.0]
+
+    canonical = cluster_duplicates(unit, threshold=0.97, block_size=4)
+    assert list(canonical) == [2, 1, 2, 3, 2, 5]
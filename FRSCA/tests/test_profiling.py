@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts import profiling
+from scripts.profiling import ProfileRing
+
+
+class BrokenProfile:
+    """Stands in for cProfile.Profile when another tool owns the hook."""
+
+    def enable(self):
+        raise ValueError("Another profiling tool is already active")
+
+    def disable(self):
+        pass
+
+
+@pytest.fixture
+def ring(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "SamplingProfiler", None)
+    return ProfileRing(str(tmp_path), sample_rate=1.0)
+
+
+def test_overlapping_requests_profile_one(ring):
+    both_inside = threading.Barrier(2, timeout=5)
+    results = []
+
+    def request(n):
+        with ring.maybe_profile({}, "generate-outfit", {"n": n}) as stats:
+            stats["pool_sizes"] = {"TOP": n}
+            both_inside.wait()
+            results.append(sum(range(1000)))
+
+    threads = [threading.Thread(target=request, args=(n,)) for n in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 2
+    assert len(ring.list()) == 1
+
+    # the lock is free again afterwards
+    with ring.maybe_profile({}, "generate-outfit", {}):
+        pass
+    assert len(ring.list()) == 2
+
+
+def test_profiler_start_failure_runs_unprofiled(ring, monkeypatch):
+    monkeypatch.setattr(profiling.cProfile, "Profile", BrokenProfile)
+
+    with ring.maybe_profile({}, "slot-alternatives", {}) as stats:
+        stats["pool_sizes"] = {"TOP": 1}
+
+    assert ring.list() == []
+    assert ring._active.acquire(blocking=False)
+
+
+def test_request_errors_still_propagate(ring):
+    with pytest.raises(KeyError):
+        with ring.maybe_profile({}, "slot-alternatives", {}):
+            raise KeyError("slot")
+
+    assert len(ring.list()) == 1
@@ -0,0 +1,82 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.rankings import Ranking, encode_cursor, decode_cursor
+
+
+def make_ranking(n=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = rng.permutation(n) + 10000
+    scores = rng.random(n).astype(np.float32)
+    return Ranking(ids, scores), ids, scores
+
+
+def walk(ranking, limit, exclude=()):
+    """Every page from the start, following next offsets."""
+    pages, offset = [], 0
+    while offset is not None:
+        positions, offset = ranking.page(offset, limit, exclude)
+        pages.append(ranking.ids[positions])
+    return pages
+
+
+def test_pages_follow_full_sort():
+    ranking, ids, scores = make_ranking()
+    expected = ids[np.argsort(-scores, kind="stable")]
+
+    pages = walk(ranking, 7)
+    assert np.array_equal(np.concatenate(pages), expected)
+    assert all(len(page) == 7 for page in pages[:-1])
+
+
+def test_lazy_sort_stays_partial():
+    ranking, _, _ = make_ranking(100000)
+    ranking.page(0, 10)
+    assert len(ranking.order) < len(ranking)
+
+
+def test_exclusions_are_skipped_and_pages_stay_full():
+    ranking, ids, scores = make_ranking()
+    expected = ids[np.argsort(-scores, kind="stable")]
+    exclude = set(expected[:50:3]) | {expected[-1], -1}
+
+    pages = walk(ranking, 10, exclude)
+    seen = np.concatenate(pages)
+    assert np.array_equal(seen, [i for i in expected if i not in exclude])
+    assert all(len(page) == 10 for page in pages[:-1])
+
+
+def test_last_page_has_no_next_offset():
+    ranking, _, _ = make_ranking(25)
+    positions, next_offset = ranking.page(20, 10)
+    assert len(positions) == 5 and next_offset is None
+
+    positions, next_offset = ranking.page(0, 25)
+    assert len(positions) == 25 and next_offset is None
+
+
+def test_non_positive_limit_is_rejected():
+    ranking, _, _ = make_ranking(10)
+    with pytest.raises(ValueError):
+        ranking.page(0, 0)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor("abc123", 40)) == ("abc123", 40)
+    # ranking ids may contain the separator; the offset is split off the end
+    assert decode_cursor(encode_cursor("a:b", 0)) == ("a:b", 0)
+
+
+@pytest.mark.parametrize("cursor", [
+    "", "not base64!", encode_cursor("abc", -1), encode_cursor("", 3),
+    "YWJj",   # "abc": no offset
+    "/w",     # not UTF-8
+])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
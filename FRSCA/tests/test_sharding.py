@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.slots import get_slot
+from scripts.rules import item_allowed
+from scripts.dedup import dedup_catalog
+from scripts.sharding import build_shards, start_local_shards, ShardCoordinator
+from scripts.generate_outfit import generate_outfit, build_item
+from scripts.slot_alternatives import recommend_slot_alternatives
+
+# (gender, category, subcategory, usage)
+KINDS = [
+    ("men", "top", "shirts", ["formal", "casual"]),
+    ("men", "top", "tees", ["casual"]),
+    ("men", "bottom", "pants", ["formal", "casual"]),
+    ("men", "bottom", "shorts", ["casual"]),
+    ("men", "outerwear", "jackets", ["cold", "formal"]),
+    ("women", "top", "blouses", ["formal", "casual"]),
+    ("women", "bottom", "skirts", ["casual"]),
+    ("women", "bottom", "pants", ["formal", "casual"]),
+    ("women", "outerwear", "blazer", ["cold", "formal"]),
+]
+
+CONTEXTS = [
+    ("men", "winter", "casual"),
+    ("men", "summer", "formal"),
+    ("women", "winter", "casual"),
+    ("women", "monsoon", "formal"),
+]
+
+
+def synthetic_catalog(proc_dir, n=480, dim=24, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = np.abs(rng.standard_normal((n, dim))).astype(np.float32)
+    # some near-duplicates so canonical_only has clusters to skip
+    for i in range(len(KINDS), n, 7):
+        embeddings[i] = embeddings[i - len(KINDS)] + 0.01 * rng.standard_normal(dim)
+
+    metadata, names = [], []
+    for i in range(n):
+        gender, category, subcategory, usage = KINDS[i % len(KINDS)]
+        name = f"{gender.upper()}-{subcategory}-id_{i:08d}-01_1_front.png"
+        metadata.append({
+            "id": i,
+            "image": name,
+            "gender": gender,
+            "category": category,
+            "subcategory": subcategory,
+            "coverage": "short" if subcategory == "shorts" else "long",
+            "usage": usage
+        })
+        names.append(name)
+    dedup_catalog(metadata, embeddings)
+
+    os.makedirs(proc_dir)
+    np.save(os.path.join(proc_dir, "embeddings.npy"), embeddings)
+    np.save(os.path.join(proc_dir, "image_names.npy"), np.array(names, dtype=object))
+    with open(os.path.join(proc_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f)
+
+    return metadata, embeddings, np.array(names, dtype=object)
+
+
+@pytest.fixture(scope="module")
+def catalog(tmp_path_factory):
+    proc_dir = str(tmp_path_factory.mktemp("catalog") / "processed")
+    return proc_dir, synthetic_catalog(proc_dir)
+
+
+@pytest.fixture(scope="module", params=["slot", "hash"])
+def coordinator(request, catalog):
+    proc_dir, _ = catalog
+    out_dir = os.path.join(proc_dir, f"shards-{request.param}")
+    build_shards(proc_dir, out_dir, scheme=request.param, n_shards=3)
+
+    index, processes, addresses = start_local_shards(out_dir)
+    coordinator = ShardCoordinator(index, addresses)
+    yield coordinator
+    coordinator.close()
+    for process in processes:
+        process.terminate()
+
+
+def ids(outfit):
+    return {slot: item["id"] for slot, item in outfit.items()}
+
+
+@pytest.mark.parametrize("canonical_only", [False, True])
+@pytest.mark.parametrize("gender,season,occasion", CONTEXTS)
+def test_outfit_matches_local(coordinator, catalog, gender, season, occasion, canonical_only):
+    _, (metadata, embeddings, names) = catalog
+    local_stats, shard_stats = {}, {}
+
+    expected = generate_outfit(
+        metadata, embeddings, names, gender, season, occasion,
+        canonical_only=canonical_only, stats=local_stats
+    )
+    outfit = coordinator.generate_outfit(
+        gender, season, occasion, canonical_only=canonical_only, stats=shard_stats
+    )
+
+    assert expected is not None
+    assert ids(outfit) == ids(expected)
+    assert shard_stats["pool_sizes"] == local_stats["pool_sizes"]
+
+
+def with_duplicate(outfit, slot, metadata, names, gender, season, occasion):
+    """The outfit with `slot` swapped for a non-canonical duplicate."""
+    for i, item in enumerate(metadata):
+        if (
+            item["canonical_id"] != i
+            and item["gender"] == gender
+            and get_slot(item) == slot
+            and item_allowed(item, slot, season, occasion)
+        ):
+            return {**outfit, slot: build_item(i, metadata, names)}
+    return None
+
+
+@pytest.mark.parametrize("canonical_only", [False, True])
+@pytest.mark.parametrize("gender,season,occasion", CONTEXTS)
+def test_alternatives_match_local(coordinator, catalog, gender, season, occasion, canonical_only):
+    _, (metadata, embeddings, names) = catalog
+    generated = generate_outfit(metadata, embeddings, names, gender, season, occasion)
+
+    for slot in generated:
+        outfits = [generated, with_duplicate(generated, slot, metadata, names, gender, season, occasion)]
+        for outfit in filter(None, outfits):
+            # whole pool, so exclusions anywhere in the ranking show up
+            expected = recommend_slot_alternatives(
+                outfit, slot, metadata, embeddings, names, gender, season, occasion,
+                top_k=len(metadata), canonical_only=canonical_only, shortlist=0
+            )
+            alternatives = coordinator.slot_alternatives(
+                outfit, slot, gender, season, occasion,
+                top_k=len(metadata), canonical_only=canonical_only
+            )
+
+            assert expected
+            assert [a["id"] for a in alternatives] == [a["id"] for a in expected]
+            assert np.allclose(
+                [a["score"] for a in alternatives], [a["score"] for a in expected], atol=1e-5
+            )